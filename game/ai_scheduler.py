@@ -0,0 +1,58 @@
+import time
+import numpy as np
+from settings import *
+from npc_arrays import ATTACK, WALK
+
+
+class AIScheduler:
+    """Which NPCs run their logic this step: near ones every step, the rest less often by distance and state."""
+    def __init__(self, game):
+        self.game = game
+        self.tick = 0
+        self.budget_ms = AI_STEP_BUDGET_MS if getattr(game, 'use_ai_budget', False) else None
+
+    def get_intervals(self, arrays):
+        # steps between logic updates of every NPC, 0 once there is nothing left to do
+        attack = arrays.pain | arrays.ray_cast_value & (arrays.dist < arrays.attack_dist)
+        search = arrays.ray_cast_value | arrays.player_search_trigger
+        longest = np.select((attack, search), (AI_STATE_INTERVALS['attack'], AI_STATE_INTERVALS['search']),
+                            AI_STATE_INTERVALS['idle'])
+        far = np.clip((arrays.dist - AI_NEAR_DIST) / (AI_FAR_DIST - AI_NEAR_DIST), 0, 1)
+        intervals = 1 + np.rint((longest - 1) * far).astype(np.intp)
+        # the death animation advances on step_trigger, so it runs every step until its last image
+        dying = arrays.frame_counter < arrays.death_frames - 1
+        return np.where(arrays.alive, intervals, dying.astype(np.intp))
+
+    def get_due(self, arrays):
+        """Rows of the NPCs that must run this step, and of the others that are due, most overdue first."""
+        self.tick += 1
+        intervals = self.get_intervals(arrays)
+        elapsed = np.where(arrays.logic_tick < 0, intervals, self.tick - arrays.logic_tick)
+        active = intervals > 0
+        urgent = active & (intervals == 1)
+        due = np.flatnonzero(active & ~urgent & (elapsed >= intervals))
+        due = due[np.argsort(intervals[due] / elapsed[due], kind='stable')]
+        return np.flatnonzero(urgent), due
+
+    def run(self, npcs, arrays, urgent, due):
+        time_start = time.perf_counter()
+        rows = np.concatenate((urgent, due))
+        # what every NPC does this step is picked from the columns at once, before any of them runs
+        states = arrays.get_logic_states(rows)
+        count = len(rows)
+        budget_ms = self.budget_ms
+        for i, (row, state) in enumerate(zip(rows.tolist(), states.tolist())):
+            if i >= len(urgent) and budget_ms is not None and (time.perf_counter() - time_start) * 1000 > budget_ms:
+                # left due, so they come first next step
+                count = i
+                break
+            npcs[row].update_logic(state)
+
+        rows, states = rows[:count], states[:count]
+        logic_tick = arrays.logic_tick[rows]
+        arrays.ticks[rows] = np.where(logic_tick < 0, 1, np.minimum(self.tick - logic_tick, AI_MAX_TICKS))
+        arrays.logic_tick[rows] = self.tick
+        # NPCs that went for the player keep looking for it once it is out of sight
+        arrays.player_search_trigger[rows] |= (states == ATTACK) | (states == WALK)
+        self.game.profiler.count('npc_logic', count)
+        self.game.profiler.count('npc_deferred', len(urgent) + len(due) - count)
@@ -0,0 +1,209 @@
+import time
+import numpy as np
+import multiprocessing as mp
+from multiprocessing.shared_memory import SharedMemory
+from settings import *
+from map import Map
+from pathfinding import get_distance_field, get_next_step
+from line_of_sight import cast_line_of_sight
+
+# shared memory rows: inputs are the player then every NPC as (x, y, alive),
+# outputs every NPC as (tile x, tile y, next step x, next step y, can see the player)
+INPUT_COLUMNS = 3
+OUTPUT_COLUMNS = 5
+
+
+def get_grid_size(game_map):
+    # bytes of the largest resident window, chunks around the player's
+    size = game_map.chunk_size * (2 * MAP_RESIDENT_RADIUS + 1)
+    return size * size
+
+
+def run_worker(conn, inputs_name, outputs_name, grid_name, capacity):
+    """Worker process loop: one request at a time, answered on the game's resident window of the map.
+
+    Tiles outside the window are read from the map file with the game's edits over it, as the game reads them."""
+    inputs_memory, outputs_memory = SharedMemory(inputs_name), SharedMemory(outputs_name)
+    grid_memory = SharedMemory(grid_name)
+    inputs = np.ndarray((capacity + 1, INPUT_COLUMNS), np.float64, inputs_memory.buf)
+    outputs = np.ndarray((capacity, OUTPUT_COLUMNS), np.intp, outputs_memory.buf)
+    game_map = Map(None)
+    graph = {}
+    goal, distances = None, {}
+    grid_key = None
+
+    def get_neighbours(node):
+        next_nodes = graph.get(node)
+        if next_nodes is None:
+            next_nodes = graph[node] = game_map.get_open_neighbours(*node)
+        return next_nodes
+
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        seq, count, key, edits = message
+        time_start = time.perf_counter()
+
+        if edits is not None:
+            # the map changed: the game's edits go over the file's chunks, read again from now on,
+            # and everything found on the old map is dropped
+            game_map.edits = edits
+            game_map.chunks.clear()
+            goal = None
+            graph.clear()
+        if key != grid_key:
+            # the game moved its window or changed the map: take its grid on
+            version, grid_x, grid_y, cols, rows = key
+            game_map.set_grid(grid_x, grid_y, cols, rows, bytearray(grid_memory.buf[:cols * rows]))
+            grid_key = key
+
+        px, py, _ = inputs[0]
+        if (int(px), int(py)) != goal:
+            goal = int(px), int(py)
+            distances = get_distance_field(get_neighbours, goal, FLOW_FIELD_RADIUS)
+
+        x, y, alive = inputs[1:count + 1].T
+        tile_x, tile_y = x.astype(np.intp), y.astype(np.intp)
+        visible = cast_line_of_sight(game_map.grid_array, game_map.grid_x, game_map.grid_y, px, py,
+                                     np.arctan2(y - py, x - px), tile_x, tile_y)
+        starts = list(zip(tile_x.tolist(), tile_y.tolist()))
+        occupied = {start for start, is_alive in zip(starts, alive.tolist()) if is_alive}
+        next_steps = [get_next_step(distances, get_neighbours, start, goal, occupied) for start in starts]
+
+        outputs[:count, 0], outputs[:count, 1] = tile_x, tile_y
+        if next_steps:
+            outputs[:count, 2:4] = next_steps
+        outputs[:count, 4] = visible
+        conn.send((seq, (time.perf_counter() - time_start) * 1000))
+
+    del inputs, outputs
+    inputs_memory.close()
+    outputs_memory.close()
+    grid_memory.close()
+
+
+class AIWorker:
+    """NPC line of sight and next steps worked out in a worker process, a step or more behind the game.
+
+    Only one request is in flight at a time; the game uses the latest answer for NPCs still on the
+    tile it was worked out for and falls back to the in-process code for the rest."""
+    def __init__(self, game, capacity):
+        self.game = game
+        self.capacity = capacity
+        self.inputs_memory = SharedMemory(create=True, size=(capacity + 1) * INPUT_COLUMNS * 8)
+        self.outputs_memory = SharedMemory(create=True, size=max(capacity, 1) * OUTPUT_COLUMNS * 8)
+        self.inputs = np.ndarray((capacity + 1, INPUT_COLUMNS), np.float64, self.inputs_memory.buf)
+        self.outputs = np.ndarray((capacity, OUTPUT_COLUMNS), np.intp, self.outputs_memory.buf)
+        # the game's resident window, copied over whenever it moves or the map changes
+        self.grid_memory = SharedMemory(create=True, size=get_grid_size(game.map))
+        self.grid_key = None
+        self.result = np.empty((0, OUTPUT_COLUMNS), np.intp)
+
+        # spawned rather than forked, the game process has SDL and the camera thread running
+        context = mp.get_context('spawn')
+        self.conn, worker_conn = context.Pipe()
+        self.process = context.Process(target=run_worker, daemon=True, args=(
+            worker_conn, self.inputs_memory.name, self.outputs_memory.name, self.grid_memory.name, capacity))
+        self.process.start()
+        self.running = True
+        self.seq = 0
+        self.in_flight = False
+        self.submit_time = 0
+        # player tile and map version of the request in flight and of the latest answer
+        self.request_key = self.result_key = None
+
+    def poll(self):
+        # pick up the answer to the request in flight, if it has come back
+        if not self.in_flight:
+            return
+        try:
+            if not self.conn.poll():
+                return
+            seq, compute_ms = self.conn.recv()
+        except (EOFError, OSError):
+            self.close()
+            return
+        self.result = self.outputs[:self.count].copy()
+        self.result_key = self.request_key
+        self.in_flight = False
+        profiler = self.game.profiler
+        profiler.add_span('ai_worker.latency', (time.perf_counter() - self.submit_time) * 1000)
+        profiler.add_span('ai_worker.compute', compute_ms)
+        profiler.count('ai_worker_results')
+
+    def submit(self, arrays):
+        if self.in_flight or not self.running or arrays.count > self.capacity:
+            return
+        player = self.game.player
+        self.count = count = arrays.count
+        self.inputs[0] = player.x, player.y, 1
+        self.inputs[1:count + 1, 0] = arrays.x
+        self.inputs[1:count + 1, 1] = arrays.y
+        self.inputs[1:count + 1, 2] = arrays.alive
+        game_map = self.game.map
+        grid_key = game_map.version, game_map.grid_x, game_map.grid_y, game_map.grid_cols, game_map.grid_rows
+        # tiles outside the window come from the map file in the worker, with the game's edits laid over them
+        edits = game_map.edits if self.grid_key is None or grid_key[0] != self.grid_key[0] else None
+        if grid_key != self.grid_key:
+            # nothing is in flight, so the worker is not reading it
+            self.grid_memory.buf[:len(game_map.grid)] = game_map.grid
+            self.grid_key = grid_key
+        self.seq += 1
+        try:
+            self.conn.send((self.seq, count, grid_key, edits))
+        except OSError:
+            self.close()
+            return
+        self.in_flight = True
+        self.request_key = player.map_pos, game_map.version
+        self.submit_time = time.perf_counter()
+
+    def is_current(self):
+        # the latest answer was worked out with the player on the tile it is on now, on the same map
+        return self.result_key == (self.game.player.map_pos, self.game.map.version)
+
+    def get_fresh(self, arrays, rows):
+        # which of rows the latest answer still holds for: the NPC is on the tile it was worked out from
+        if not self.is_current():
+            return np.zeros(len(rows), np.bool_)
+        result = self.result[np.minimum(rows, len(self.result) - 1)]
+        return ((rows < len(self.result)) & (result[:, 0] == arrays.x[rows].astype(np.intp))
+                & (result[:, 1] == arrays.y[rows].astype(np.intp)))
+
+    def apply_line_of_sight(self, arrays, rows):
+        """Set ray_cast_value of rows from the latest answer, returns the rows it has no answer for."""
+        fresh = self.get_fresh(arrays, rows)
+        arrays.ray_cast_value[rows[fresh]] = self.result[rows[fresh], 4]
+        stale = rows[~fresh]
+        self.game.profiler.count('ai_worker_fallbacks', len(stale))
+        return stale
+
+    def get_next_step(self, npc):
+        # None when the latest answer was for another tile
+        if npc.index < len(self.result) and self.is_current():
+            start_x, start_y, next_x, next_y, _ = self.result[npc.index].tolist()
+            if (start_x, start_y) == npc.map_pos:
+                return next_x, next_y
+        self.game.profiler.count('ai_worker_fallbacks')
+        return None
+
+    def close(self):
+        if not self.running:
+            return
+        self.running = False
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+        del self.inputs, self.outputs
+        self.inputs_memory.close()
+        self.inputs_memory.unlink()
+        self.outputs_memory.close()
+        self.outputs_memory.unlink()
+        self.grid_memory.close()
+        self.grid_memory.unlink()
@@ -0,0 +1,35 @@
+class AnimationGroup:
+    """Sprites animated every period ms, stepped together from one timer."""
+    def __init__(self, period, time):
+        self.period = period
+        self.time_prev = time
+        self.ticks = 0  # periods elapsed, sprites compare it with the count they last saw
+        # frame index per animation, shared by every sprite that shows it in step with the group
+        self.cursors = {}
+
+    def update(self, time):
+        if time - self.time_prev > self.period:
+            self.time_prev = time
+            self.ticks += 1
+            self.cursors = {images: (frame + 1) % len(images) for images, frame in self.cursors.items()}
+
+    def get_frame(self, images):
+        return images[self.cursors.setdefault(images, 0)]
+
+
+class AnimationClock:
+    """One timer per animation period, advanced once a frame on game time so replays animate the same."""
+    def __init__(self, game):
+        self.game = game
+        self.groups = {}
+
+    def get_group(self, period):
+        group = self.groups.get(period)
+        if group is None:
+            group = self.groups[period] = AnimationGroup(period, self.game.time)
+        return group
+
+    def update(self):
+        time = self.game.time
+        for group in self.groups.values():
+            group.update(time)
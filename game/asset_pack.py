@@ -0,0 +1,61 @@
+import os
+import json
+import mmap
+import struct
+import pygame as pg
+
+# file layout: header, raw RGBA pixels of every surface back to back, then a JSON index
+# of key -> [offset, width, height, source mtime_ns]
+MAGIC = b'DPAK'
+VERSION = 1
+HEADER = struct.Struct('<4sHQQ')  # magic, version, index offset, index length
+ALIGN = 16
+
+
+def get_key(path, size=None, method=None):
+    if size is None:
+        return path
+    return f'{path}:{size[0]}x{size[1]}:{method}'
+
+
+def save_pack(path, surfaces):
+    """Write (key, source path, surface) triples as one archive."""
+    index = {}
+    with open(path, 'wb') as file:
+        file.write(bytes(HEADER.size))
+        for key, source_path, surface in surfaces:
+            file.write(bytes(-file.tell() % ALIGN))
+            index[key] = [file.tell(), *surface.get_size(), os.stat(source_path).st_mtime_ns]
+            file.write(pg.image.tobytes(surface, 'RGBA'))
+        index_offset = file.tell()
+        index_data = json.dumps(index).encode()
+        file.write(index_data)
+        file.seek(0)
+        file.write(HEADER.pack(MAGIC, VERSION, index_offset, len(index_data)))
+
+
+class AssetPack:
+    """Surfaces straight from the pixels of a memory-mapped archive, no image decoding."""
+    def __init__(self, data):
+        self.data = data
+        magic, version, index_offset, index_length = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'not a version {VERSION} asset pack')
+        self.index = json.loads(bytes(data[index_offset:index_offset + index_length]))
+
+    @classmethod
+    def open(cls, path):
+        with open(path, 'rb') as file:
+            return cls(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def get_sources(self):
+        return {key.split(':')[0] for key in self.index}
+
+    def get_surface(self, key, source_path):
+        # None when the key was never packed or its source image changed since the build
+        entry = self.index.get(key)
+        if entry is None or entry[3] != os.stat(source_path).st_mtime_ns:
+            return None
+        offset, width, height, _ = entry
+        pixels = memoryview(self.data)[offset:offset + width * height * 4]
+        return pg.image.frombuffer(pixels, (width, height), 'RGBA').convert_alpha()
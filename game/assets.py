@@ -0,0 +1,85 @@
+import os
+import pygame as pg
+from concurrent.futures import ThreadPoolExecutor
+from settings import *
+from asset_pack import AssetPack, get_key
+
+
+class Assets:
+    """Images loaded once per process and shared by every sprite, never modified after loading."""
+    def __init__(self):
+        self.images = {}
+        self.animations = {}
+        self.pack = None
+        self.decoded = {}  # PNGs decoded ahead of time, not yet converted
+        self.requests = []  # every (path, size, method) loaded, what build_assets.py packs
+        self.preloaded = False
+
+    def preload(self, root='resources'):
+        # surfaces come from the packed archive when there is one; PNGs it does not
+        # cover are decoded on a thread pool up front instead of one by one on first use
+        if self.preloaded:
+            return
+        self.preloaded = True
+        if os.path.exists(ASSET_PACK_PATH):
+            self.pack = AssetPack.open(ASSET_PACK_PATH)
+        packed = self.pack.get_sources() if self.pack else set()
+        paths = [os.path.join(folder, file_name).replace(os.sep, '/')
+                 for folder, _, file_names in os.walk(root) for file_name in sorted(file_names)
+                 if file_name.endswith('.png')]
+        paths = [path for path in paths if path not in packed]
+        with ThreadPoolExecutor() as pool:
+            self.decoded.update(zip(paths, pool.map(pg.image.load, paths)))
+
+    def load(self, path, size=None, method=None):
+        key = get_key(path, size, method)
+        image = self.images.get(key)
+        if image is not None:
+            return image
+        self.requests.append((path, size, method))
+
+        if self.pack:
+            image = self.pack.get_surface(key, path)
+        if image is None:
+            # a scaled copy reuses the full size image if that is already loaded; the decoded PNG
+            # is dropped either way, the surfaces made from it are what is kept
+            decoded = self.decoded.pop(path, None)
+            image = self.images.get(path) or decoded or pg.image.load(path)
+            image = image.convert_alpha()
+            if method == 'scale':
+                image = pg.transform.scale(image, size)
+            elif method == 'smoothscale':
+                image = pg.transform.smoothscale(image, size)
+        self.images[key] = image
+        return image
+
+    def release_decoded(self):
+        # PNGs nothing asked for while the game started, loaded from disk if they are ever needed
+        self.decoded.clear()
+
+    def get_image(self, path):
+        return self.load(path)
+
+    def get_texture(self, path, size):
+        return self.load(path, tuple(size), 'scale')
+
+    def get_animation(self, path, scale=1):
+        # frames of an animation folder in file name order, optionally smoothscaled
+        key = path, scale
+        frames = self.animations.get(key)
+        if frames is None:
+            paths = [path + '/' + file_name for file_name in sorted(os.listdir(path))
+                     if os.path.isfile(os.path.join(path, file_name))]
+            if scale == 1:
+                frames = tuple(self.get_image(frame_path) for frame_path in paths)
+            else:
+                frames = []
+                for frame_path in paths:
+                    width, height = self.get_image(frame_path).get_size()
+                    frames.append(self.load(frame_path, (int(width * scale), int(height * scale)), 'smoothscale'))
+                frames = tuple(frames)
+            self.animations[key] = frames
+        return frames
+
+
+assets = Assets()
@@ -0,0 +1,323 @@
+import os
+import sys
+import time
+import math
+import random
+import argparse
+from types import SimpleNamespace
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import numpy as np
+import pygame as pg
+from settings import *
+from map import Map, NEIGHBOURS
+from player import Player
+from object_renderer import ObjectRenderer
+from raycasting import RayCasting
+from profiler import FrameProfiler
+from animation import AnimationClock
+from npc import SoldierNPC
+from npc_arrays import NPCArrays
+from line_of_sight import LineOfSight, cast_line_of_sight
+
+
+class BenchGame:
+    """Just enough of Game to drive the ray caster without a window or camera."""
+    def __init__(self):
+        pg.init()
+        self.screen = pg.display.set_mode(RES)
+        self.delta_time = 1
+        self.time = 0
+        self.sim_time = 0
+        self.animation_clock = AnimationClock(self)
+        self.profiler = FrameProfiler(self)
+        self.map = Map(self)
+        self.player = Player(self)
+        self.object_renderer = ObjectRenderer(self)
+        self.raycasting = RayCasting(self)
+
+    def get_poses(self, count, seed):
+        rng = random.Random(seed)
+        poses = []
+        while len(poses) < count:
+            x, y = rng.uniform(1, self.map.cols - 1), rng.uniform(1, self.map.rows - 1)
+            if not self.map.is_wall(int(x), int(y)):
+                poses.append((x, y, rng.uniform(0, math.tau)))
+        return poses
+
+    def get_npcs(self, count, seed):
+        # NPCs sharing one set of arrays, as ObjectHandler's
+        npc_arrays = NPCArrays()
+        npcs = [SoldierNPC(self, pos=(x, y)) for x, y, _ in self.get_poses(count, seed)]
+        for npc in npcs:
+            npc_arrays.add(npc)
+        return npcs
+
+    def set_pose(self, pose):
+        self.player.x, self.player.y, self.player.angle = pose
+        self.map.update()
+
+
+class WorldMapPlayer:
+    """Player.check_wall as it was, reading world_map through the game like the rest of Player."""
+    def __init__(self, world_map):
+        self.game = SimpleNamespace(map=SimpleNamespace(world_map=world_map))
+
+    def check_wall(self, x, y):
+        return (x, y) not in self.game.map.world_map
+
+
+def check_ray_cast_parity(game, poses):
+    raycasting = game.raycasting
+    max_error, texture_mismatches = 0.0, 0
+    for pose in poses:
+        game.set_pose(pose)
+        raycasting.ray_cast_python()
+        expected = np.array(raycasting.ray_casting_result)
+        raycasting.ray_cast_numpy()
+        result = np.array(raycasting.ray_casting_result)
+
+        max_error = max(max_error, np.abs(result[:, [0, 3]] - expected[:, [0, 3]]).max())
+        texture_mismatches += int((result[:, 2] != expected[:, 2]).sum())
+    return max_error, texture_mismatches
+
+
+def check_line_of_sight_parity(game, poses, npcs, seed):
+    # NPCs scattered over open tiles around each pose, batch answers against NPC.ray_cast_player_npc
+    line_of_sight = LineOfSight(game)
+    npc_arrays, rows = npcs[0].arrays, np.arange(len(npcs))
+    mismatches, grid_mismatches = 0, 0
+    for pose, npc_poses in zip(poses, np.array_split(game.get_poses(len(poses) * len(npcs), seed), len(poses))):
+        game.set_pose(pose)
+        game.raycasting.update()
+        for npc, (x, y, _) in zip(npcs, npc_poses):
+            npc.x, npc.y = x, y
+            npc.locate()
+        expected = np.array([npc.ray_cast_player_npc() for npc in npcs])
+
+        npc_arrays.locate(game.player.x, game.player.y)
+        line_of_sight.update(npc_arrays, rows)
+        mismatches += int((npc_arrays.ray_cast_value != expected).sum())
+        game_map = game.map
+        visible = cast_line_of_sight(game_map.grid_array, game_map.grid_x, game_map.grid_y, game.player.x,
+                                     game.player.y, np.array([npc.theta for npc in npcs]),
+                                     np.array([npc.map_pos[0] for npc in npcs]),
+                                     np.array([npc.map_pos[1] for npc in npcs]))
+        grid_mismatches += int((visible != expected).sum())
+    return mismatches, grid_mismatches, line_of_sight.from_depth_buffer, line_of_sight.from_grid
+
+
+def bench_line_of_sight(game, poses, npcs, frames):
+    # only the line of sight tests are timed, the walls are cast for each pose beforehand
+    line_of_sight = LineOfSight(game)
+    npc_arrays, rows = npcs[0].arrays, np.arange(len(npcs))
+    scalar_time, batch_time = 0, 0
+    for frame in range(frames):
+        game.set_pose(poses[frame % len(poses)])
+        game.raycasting.update()
+        time_start = time.perf_counter()
+        for npc in npcs:
+            npc.locate()
+            npc.ray_cast_player_npc()
+        scalar_time += time.perf_counter() - time_start
+
+        time_start = time.perf_counter()
+        npc_arrays.locate(game.player.x, game.player.y)
+        line_of_sight.update(npc_arrays, rows)
+        batch_time += time.perf_counter() - time_start
+    return scalar_time / frames * 1000, batch_time / frames * 1000
+
+
+def bench_ray_cast(game, poses, backend, frames, step):
+    raycasting = game.raycasting
+    raycasting.backend = backend
+    game.object_renderer.wall_render_mode = 'blit'
+    step = getattr(raycasting, step)
+    time_start = time.perf_counter()
+    for frame in range(frames):
+        game.set_pose(poses[frame % len(poses)])
+        step()
+    return frames / (time.perf_counter() - time_start)
+
+
+def bench_render(game, poses, mode, frames):
+    game.raycasting.backend = RAY_CAST_BACKEND
+    game.object_renderer.wall_render_mode = mode
+    time_start = time.perf_counter()
+    for frame in range(frames):
+        game.set_pose(poses[frame % len(poses)])
+        game.raycasting.update()
+        game.object_renderer.render_game_objects()
+    return frames / (time.perf_counter() - time_start)
+
+
+def bench_resolution(game, poses, scale, frames):
+    # background, walls and the stretch to the window at one level of the resolution scaler
+    game.raycasting.set_resolution(int(NUM_RAYS * scale))
+    game.object_renderer.wall_render_mode = WALL_RENDER_MODE
+    time_start = time.perf_counter()
+    for frame in range(frames):
+        game.set_pose(poses[frame % len(poses)])
+        game.raycasting.update()
+        game.object_renderer.draw_background()
+        game.object_renderer.render_game_objects()
+    game.raycasting.set_resolution(NUM_RAYS)
+    return frames / (time.perf_counter() - time_start)
+
+
+def bench_map_lookup(game, count, seed):
+    # the tile probes of spawning, collision and the path search, through the methods they call,
+    # against a world_map dict as Map used to build
+    rng = random.Random(seed)
+    game_map = game.map
+    x0, y0, rows, cols = game_map.grid_x, game_map.grid_y, game_map.grid_rows, game_map.grid_cols
+    points = [(x0 + rng.randrange(-2, cols + 2), y0 + rng.randrange(-2, rows + 2)) for _ in range(count)]
+    world_map = {(i, j): game_map.get_tile(i, j) for j in range(y0 - 2, y0 + rows + 2)
+                 for i in range(x0 - 2, x0 + cols + 2) if game_map.get_tile(i, j)}
+
+    time_start = time.perf_counter()
+    for x, y in points:
+        wall = (x, y) in world_map
+    dict_rate = count / (time.perf_counter() - time_start)
+
+    is_wall = game_map.is_wall
+    time_start = time.perf_counter()
+    for x, y in points:
+        wall = is_wall(x, y)
+    map_rate = count / (time.perf_counter() - time_start)
+
+    # the player's collision probes, inside the window, through Player.check_wall and as it read world_map
+    probes = [(x0 + rng.randrange(1, cols - 1), y0 + rng.randrange(1, rows - 1)) for _ in range(count)]
+
+    check_wall = WorldMapPlayer(world_map).check_wall
+    time_start = time.perf_counter()
+    for x, y in probes:
+        free = check_wall(x, y)
+    dict_probe_rate = count / (time.perf_counter() - time_start)
+
+    check_wall = game.player.check_wall
+    time_start = time.perf_counter()
+    for x, y in probes:
+        free = check_wall(x, y)
+    player_probe_rate = count / (time.perf_counter() - time_start)
+
+    # neighbour lists of the path graph, for the open tiles the search expands
+    nodes = [point for point in points[::8] if point not in world_map]
+    ways = NEIGHBOURS
+    time_start = time.perf_counter()
+    for x, y in nodes:
+        next_nodes = [(x + dx, y + dy) for dx, dy in ways if (x + dx, y + dy) not in world_map]
+    dict_node_rate = len(nodes) / (time.perf_counter() - time_start)
+
+    get_open_neighbours = game_map.get_open_neighbours
+    time_start = time.perf_counter()
+    for x, y in nodes:
+        next_nodes = get_open_neighbours(x, y)
+    map_node_rate = len(nodes) / (time.perf_counter() - time_start)
+    return dict_rate, map_rate, dict_probe_rate, player_probe_rate, dict_node_rate, map_node_rate
+
+
+def check_map_edit(game, poses):
+    # a wall put in front of the player with Map.set_tile shows in the next update, not a reused cast,
+    # and clearing it again brings the old depths back
+    raycasting = game.raycasting
+    failures = 0
+    for x, y, angle in poses:
+        game.set_pose((x, y, angle))
+        raycasting.update()
+        depth = raycasting.depth_buffer.copy()
+        centre = len(depth) // 2
+        if depth[centre] < 3:
+            continue
+        tile = int(x + 2 * math.cos(angle)), int(y + 2 * math.sin(angle))
+        if tile == game.player.map_pos or game.map.is_wall(*tile):
+            continue
+        game.map.set_tile(*tile, 1)
+        raycasting.update()
+        failures += bool(raycasting.depth_buffer[centre] >= depth[centre])
+        game.map.set_tile(*tile, 0)
+        raycasting.update()
+        failures += not np.array_equal(raycasting.depth_buffer, depth)
+    return failures
+
+
+def bench_reuse(game, pose, turn, frames):
+    # the same pose every frame, turning by a whole number of rays
+    raycasting = game.raycasting
+    raycasting.backend = RAY_CAST_BACKEND
+    game.object_renderer.wall_render_mode = 'blit'
+    game.set_pose(pose)
+    skipped_casts, reused_rays = raycasting.skipped_casts, raycasting.reused_rays
+    time_start = time.perf_counter()
+    for frame in range(frames):
+        game.player.angle += turn * raycasting.delta_angle
+        raycasting.update()
+    fps = frames / (time.perf_counter() - time_start)
+    return fps, raycasting.skipped_casts - skipped_casts, raycasting.reused_rays - reused_rays
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ray casting parity check and benchmark')
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--poses', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    game = BenchGame()
+    poses = game.get_poses(args.poses, args.seed)
+
+    max_error, texture_mismatches = check_ray_cast_parity(game, poses)
+    print(f'parity: max depth/offset error {max_error:.3g}, '
+          f'texture mismatches {texture_mismatches} / {len(poses) * NUM_RAYS}')
+
+    for backend in ('python', 'numpy'):
+        cast_fps = bench_ray_cast(game, poses, backend, args.frames, 'ray_cast')
+        update_fps = bench_ray_cast(game, poses, backend, args.frames, 'update')
+        print(f'{backend:>6}: ray_cast {cast_fps:.1f} frames/s, update {update_fps:.1f} frames/s')
+
+    rates = bench_map_lookup(game, 200000, args.seed)
+    dict_rate, map_rate, dict_probe_rate, player_probe_rate, dict_node_rate, map_node_rate = rates
+    print(f'tile lookups: world_map dict {dict_rate / 1e6:.2f} M/s, Map.is_wall {map_rate / 1e6:.2f} M/s')
+    print(f'collision probes: world_map dict {dict_probe_rate / 1e6:.2f} M/s, '
+          f'Player.check_wall {player_probe_rate / 1e6:.2f} M/s')
+    print(f'neighbour lists: world_map dict {dict_node_rate / 1e3:.0f} k/s, '
+          f'Map.get_open_neighbours {map_node_rate / 1e3:.0f} k/s')
+
+    edit_failures = check_map_edit(game, poses[:20])
+    print(f'map edits: {edit_failures} casts missed a set_tile change')
+
+    for turn in (0, 3):
+        fps, skipped_casts, reused_rays = bench_reuse(game, poses[0], turn, args.frames)
+        print(f'turning {turn} rays/frame: {fps:.1f} frames/s, '
+              f'{skipped_casts} casts skipped, {reused_rays} rays reused')
+
+    for mode in ('blit', 'buffer'):
+        fps = bench_render(game, poses, mode, args.frames)
+        print(f'{mode:>6} walls: {fps:.1f} frames/s')
+
+    npcs = game.get_npcs(40, args.seed)
+    mismatches, grid_mismatches, from_depth_buffer, from_grid = check_line_of_sight_parity(game, poses, npcs, args.seed)
+    checks = len(poses) * len(npcs)
+    print(f'line of sight parity: {mismatches} batch / {grid_mismatches} grid mismatches of {checks}, '
+          f'{from_depth_buffer} answered from the depth buffer, {from_grid} cast on the grid')
+    for count in (10, 40, 160):
+        scalar_ms, batch_ms = bench_line_of_sight(game, poses, game.get_npcs(count, args.seed), args.frames)
+        print(f'line of sight, {count} NPCs: per NPC {scalar_ms:.3f} ms/frame, batch {batch_ms:.3f} ms/frame')
+
+    column_cache = game.raycasting.column_cache
+    print(f'wall column cache: {column_cache.hits} hits, {column_cache.misses} misses '
+          f'({column_cache.hit_rate:.1%}), {len(column_cache.surfaces)} strips, {column_cache.size / 2 ** 20:.1f} MiB')
+
+    # last, each level drops the column cache
+    for scale in DYNAMIC_RES_SCALES:
+        fps = bench_resolution(game, poses, scale, args.frames)
+        print(f'render scale {scale:.0%}: {fps:.1f} frames/s')
+
+    if max_error > 1e-6 or texture_mismatches or mismatches or grid_mismatches or edit_failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+import os
+import time
+import argparse
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+from settings import *
+from asset_pack import save_pack, get_key
+from assets import assets
+from headless import HeadlessGame
+
+
+def collect_requests():
+    # start a game the normal way and note every image it loads, at the sizes it loads them,
+    # decoding the PNGs rather than reading an existing archive
+    assets.preloaded = True
+    game = HeadlessGame(seed=0)
+    try:
+        for weapon_name in game.weapon.weapons:
+            game.weapon.load_weapon(weapon_name)
+    finally:
+        game.close()
+    return assets.requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=f'Pre-scale every image the game loads into {ASSET_PACK_PATH}')
+    parser.add_argument('--output', default=ASSET_PACK_PATH)
+    args = parser.parse_args()
+
+    time_start = time.perf_counter()
+    surfaces = []
+    for request in collect_requests():
+        key = get_key(*request)
+        surfaces.append((key, request[0], assets.images[key]))
+    save_pack(args.output, surfaces)
+    print(f'packed {len(surfaces)} surfaces into {args.output} '
+          f'({os.path.getsize(args.output) / 2 ** 20:.1f} MiB) in {time.perf_counter() - time_start:.1f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+import os
+import sys
+import json
+import math
+import time
+import argparse
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import numpy as np
+from settings import *
+from main import Game
+
+
+class ScriptedCamera:
+    """Stands in for VirtualMouse: sweeps the index finger and makes the gun gesture on a fixed schedule."""
+    def __init__(self, sweep=400, period=240, fire_every=45):
+        self.index_coords = None
+        self.prev_index_x = 0
+        self.fist_flag = False
+        self.gun_flag = False
+        self.sweep = sweep
+        self.period = period
+        self.fire_every = fire_every
+
+    def run(self):
+        pass
+
+    def step(self, frame):
+        index_x = int(HALF_WIDTH + self.sweep * math.sin(math.tau * frame / self.period))
+        if self.index_coords is None:
+            self.prev_index_x = index_x
+        self.index_coords = (index_x, HALF_HEIGHT)
+        self.gun_flag = frame % self.fire_every < 2
+
+
+class HeadlessGame(Game):
+    def __init__(self, seed, dynamic_res=False, record_path=None, replay_path=None, use_ai_worker=AI_WORKER,
+                 use_ai_budget=False):
+        # both off by default: frame time would otherwise change what two runs with one seed do
+        self.dynamic_res = dynamic_res
+        super().__init__(ScriptedCamera(), seed, record_path, replay_path, use_ai_worker, use_ai_budget)
+
+    def new_game(self):
+        super().new_game()
+        self.resolution.enabled = self.dynamic_res
+
+    def tick(self):
+        # the simulation advances at the target rate whatever the real frame time is
+        self.clock.tick()
+        self.delta_time = 1000 / FPS
+
+    def wait_for_restart(self):
+        pass
+
+    def run_frames(self, frames, warmup):
+        frame_times = []
+        for frame in range(warmup + frames):
+            if self.input.finished:
+                break
+            if self.virtual_mouse:
+                self.virtual_mouse.step(frame)
+            if frame == warmup:
+                # the report's hit rate covers the measured frames only
+                self.object_renderer.sprite_cache.reset_stats()
+            time_start = time.perf_counter()
+            self.check_events()
+            self.update()
+            self.draw()
+            if frame >= warmup:
+                frame_times.append((time.perf_counter() - time_start) * 1000)
+        self.close()
+        return np.array(frame_times)
+
+
+def get_report(frame_times, args, game):
+    percentiles = np.percentile(frame_times, (50, 90, 95, 99))
+    sprite_cache = game.object_renderer.sprite_cache
+    return {
+        'frames': len(frame_times),
+        'warmup': args.warmup,
+        'seed': game.seed,
+        'resolution': list(RES),
+        'fps': len(frame_times) / frame_times.sum() * 1000,
+        'frame_ms': {
+            'mean': frame_times.mean(),
+            'p50': percentiles[0],
+            'p90': percentiles[1],
+            'p95': percentiles[2],
+            'p99': percentiles[3],
+            'max': frame_times.max(),
+        },
+        'sprite_cache': {
+            'hit_rate': sprite_cache.hit_rate,
+            'surfaces': len(sprite_cache.surfaces),
+            'mib': sprite_cache.size / 2 ** 20,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the full game headless and report frame timings as JSON')
+    parser.add_argument('--frames', type=int, default=600)
+    parser.add_argument('--warmup', type=int, default=60)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--dynamic-res', action='store_true', help='let the resolution scaler react to frame time')
+    parser.add_argument('--ai-budget', action='store_true',
+                        help='defer far NPC logic past AI_STEP_BUDGET_MS of a step, ignored with --record and --replay')
+    parser.add_argument('--output', help='write the report to this file instead of stdout')
+    parser.add_argument('--record', metavar='PATH', help='write the scripted input to PATH')
+    parser.add_argument('--replay', metavar='PATH', help='drive the game from a log written with --record, '
+                                                         'the seed comes from the log')
+    parser.add_argument('--ai-worker', action='store_true', default=AI_WORKER,
+                        help='NPC line of sight and paths in a worker process, ignored with --record and --replay')
+    parser.add_argument('--profile-csv', help='write per-stage timings and work counters of the last frames to this file')
+    args = parser.parse_args()
+
+    game = HeadlessGame(args.seed, args.dynamic_res, args.record, args.replay, args.ai_worker, args.ai_budget)
+    report = get_report(game.run_frames(args.frames, args.warmup), args, game)
+    if args.profile_csv:
+        game.profiler.dump_csv(args.profile_csv)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+import math
+import numpy as np
+from settings import *
+
+
+def accumulate(start, step):
+    # start, start + step, ... summed in order like the scalar loop so every value matches it exactly
+    values = np.empty((MAX_DEPTH, len(start)))
+    values[0] = start
+    values[1:] = step
+    return np.cumsum(values, axis=0, out=values)
+
+
+def march(x, y, dx, dy, depth, delta_depth, npc_x, npc_y, grid, grid_x, grid_y):
+    # depth to the NPC's tile or to the first wall, whichever each ray reaches first, as NPC.ray_cast_player_npc
+    x, y, depth = accumulate(x, dx), accumulate(y, dy), accumulate(depth, delta_depth)
+
+    tile_x, tile_y = x.astype(np.intp), y.astype(np.intp)
+    at_npc = (tile_x == npc_x) & (tile_y == npc_y)
+    tile_x -= grid_x
+    tile_y -= grid_y
+    rows, cols = grid.shape
+    # tiles outside the resident window count as walls, like OUT_OF_BOUNDS in Map.is_wall
+    outside = (tile_x < 0) | (tile_x >= cols) | (tile_y < 0) | (tile_y >= rows)
+    tiles = grid.take(np.where(outside, 0, tile_y * cols + tile_x))
+
+    event = at_npc | outside | (tiles > 0)
+    step = event.argmax(axis=0)
+    rays = np.arange(len(step))
+    hit = event[step, rays]
+    found_npc = hit & at_npc[step, rays]
+    event_depth = depth[step, rays]
+    return np.where(found_npc, event_depth, 0), np.where(hit & ~found_npc, event_depth, 0)
+
+
+def cast_line_of_sight(grid, grid_x, grid_y, ox, oy, theta, npc_x, npc_y):
+    """NPC.ray_cast_player_npc for many NPCs at once: rays from the player at ox, oy along theta."""
+    x_map, y_map = int(ox), int(oy)
+    sin_a = np.sin(theta)
+    cos_a = np.cos(theta)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # horizontals
+        y_hor = np.where(sin_a > 0, y_map + 1, y_map - 1e-6)
+        dy = np.where(sin_a > 0, 1, -1)
+
+        depth_hor = (y_hor - oy) / sin_a
+        x_hor = ox + depth_hor * cos_a
+
+        delta_depth_hor = dy / sin_a
+        dx_hor, dy_hor = delta_depth_hor * cos_a, dy
+
+        # verticals
+        x_vert = np.where(cos_a > 0, x_map + 1, x_map - 1e-6)
+        dx = np.where(cos_a > 0, 1, -1)
+
+        depth_vert = (x_vert - ox) / cos_a
+        y_vert = oy + depth_vert * sin_a
+
+        delta_depth_vert = dx / cos_a
+        dx_vert, dy_vert = dx, delta_depth_vert * sin_a
+
+        # both sets of rays marched together, horizontals first
+        player_dist, wall_dist = march(*(np.concatenate(pair) for pair in (
+            (x_hor, x_vert), (y_hor, y_vert), (dx_hor, dx_vert), (dy_hor, dy_vert),
+            (depth_hor, depth_vert), (delta_depth_hor, delta_depth_vert), (npc_x, npc_x), (npc_y, npc_y))),
+            grid, grid_x, grid_y)
+    player_dist_h, player_dist_v = np.split(player_dist, 2)
+    wall_dist_h, wall_dist_v = np.split(wall_dist, 2)
+
+    player_dist = np.maximum(player_dist_v, player_dist_h)
+    wall_dist = np.maximum(wall_dist_v, wall_dist_h)
+    visible = (0 < player_dist) & (player_dist < wall_dist) | (wall_dist == 0)
+    return visible | ((npc_x == x_map) & (npc_y == y_map))
+
+
+class LineOfSight:
+    """Which NPCs can see the player, answered for all of them once per frame."""
+    def __init__(self, game):
+        self.game = game
+        self.from_depth_buffer = 0
+        self.from_grid = 0
+
+    def update(self, arrays, rows):
+        # rows of NPCArrays, after its locate
+        rows = rows[arrays.alive[rows]]
+        if not len(rows):
+            return
+        player = self.game.player
+        theta, dist = arrays.theta[rows], arrays.dist[rows]
+        npc_x, npc_y = arrays.x[rows].astype(np.intp), arrays.y[rows].astype(np.intp)
+
+        visible, known = self.check_depth_buffer(theta, dist)
+        unknown = np.flatnonzero(~known)
+        if len(unknown):
+            game_map = self.game.map
+            visible[unknown] = cast_line_of_sight(game_map.grid_array, game_map.grid_x, game_map.grid_y,
+                                                  player.x, player.y, theta[unknown],
+                                                  npc_x[unknown], npc_y[unknown])
+        self.from_depth_buffer += len(rows) - len(unknown)
+        self.from_grid += len(unknown)
+        arrays.ray_cast_value[rows] = visible
+
+    def check_depth_buffer(self, theta, dist):
+        # NPCs well inside the FOV, against the wall depth the ray caster found for the rays next to them.
+        # Only where those depths are smooth and the NPC is clearly in front of or behind the wall,
+        # everything else is left to the exact grid test
+        raycasting = self.game.raycasting
+        wall_depth = raycasting.raw_ray_arrays[0]
+        num_rays = len(wall_depth)
+        first_angle = self.game.player.angle - HALF_FOV + 0.0001
+        delta = (theta - first_angle + math.pi) % math.tau - math.pi
+        ray = np.rint(delta / raycasting.delta_angle).astype(np.intp)
+        in_view = (ray >= LOS_RAY_WINDOW) & (ray < num_rays - LOS_RAY_WINDOW)
+
+        window = wall_depth[np.clip(ray, LOS_RAY_WINDOW, num_rays - LOS_RAY_WINDOW - 1)[:, None]
+                            + np.arange(-LOS_RAY_WINDOW, LOS_RAY_WINDOW + 1)]
+        near, far = window.min(axis=1), window.max(axis=1)
+        smooth = in_view & (far - near < LOS_DEPTH_MARGIN) & (dist < MAX_DEPTH - 2)
+
+        # the NPC's tile starts at most half a diagonal in front of the NPC
+        visible = smooth & (dist + LOS_DEPTH_MARGIN < near)
+        hidden = smooth & (far + LOS_DEPTH_MARGIN < dist - math.sqrt(0.5))
+        return visible, visible | hidden
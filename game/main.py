@@ -1,6 +1,7 @@
 import pygame as pg
-import sys
 import os
+import sys
+import argparse
 import threading
 from settings import *
 from map import *
@@ -12,30 +13,66 @@ from object_handler import *
 from weapon import *
 from sound import *
 from pathfinding import *
-from mouse import VirtualMouse  # Import the VirtualMouse class
+from resolution import ResolutionScaler
+from profiler import FrameProfiler
+from animation import AnimationClock
+from replay import LiveInput, InputRecorder, InputReplayer
+from assets import assets
+from random import seed as random_seed  # imported last, the star imports above bring in random()
 from pause_menu import PauseMenu
-sys.path.append(os.path.abspath('..'))
-from cvzone.HandTrackingModule import HandDetector
+
+
 class Game:
-    def __init__(self):
+    def __init__(self, virtual_mouse=None, seed=None, record_path=None, replay_path=None, use_ai_worker=AI_WORKER,
+                 use_ai_budget=True):
         pg.init()
         pg.mouse.set_visible(False)
         self.screen = pg.display.set_mode(RES)
+        assets.preload()
         pg.event.set_grab(True)
         self.clock = pg.time.Clock()
         self.delta_time = 1
+        self.time = 0  # simulated milliseconds, advanced by delta_time
+        self.sim_time = 0  # time of the last fixed simulation step, trails time by less than a step
+        self.sim_alpha = 0  # how far time is between that step and the next
         self.global_trigger = False
+        self.round_over = None  # 'lost' or 'won' once the round has ended, until the next update restarts it
+        self.step_trigger = False  # global_trigger kept until a simulation step has seen it
         self.global_event = pg.USEREVENT + 0
         pg.time.set_timer(self.global_event, 40)
+        self.profiler = FrameProfiler(self)
+        self.use_ai_worker = use_ai_worker
+        # a wall clock budget on NPC logic would make a recorded game replay differently
+        self.use_ai_budget = use_ai_budget and not record_path and not replay_path
+
+        if replay_path:
+            # a replay needs neither the camera nor the real devices
+            self.virtual_mouse = None
+            self.input = InputReplayer(self, replay_path)
+            seed = self.input.seed
+        else:
+            # Start the virtual mouse in a separate thread
+            if virtual_mouse is None:
+                from mouse import VirtualMouse  # needs the camera stack, so only imported when used
+                virtual_mouse = VirtualMouse()
+            self.virtual_mouse = virtual_mouse
+            self.mouse_thread = threading.Thread(target=self.virtual_mouse.run, daemon=True)
+            self.mouse_thread.start()
 
-        # Start the virtual mouse in a separate thread
-        self.virtual_mouse = VirtualMouse()
-        self.mouse_thread = threading.Thread(target=self.virtual_mouse.run, daemon=True)
-        self.mouse_thread.start()
+            if seed is None:
+                seed = int.from_bytes(os.urandom(4), 'little')
+            if record_path:
+                self.input = InputRecorder(self, virtual_mouse, record_path, seed)
+            else:
+                self.input = LiveInput(self, virtual_mouse)
+        self.seed = seed
+        random_seed(seed)
 
         self.new_game()
+        assets.release_decoded()
 
     def new_game(self):
+        self.animation_clock = AnimationClock(self)
         self.map = Map(self)
         self.player = Player(self)
         self.object_renderer = ObjectRenderer(self)
@@ -44,50 +81,134 @@ class Game:
         self.weapon = Weapon(self)
         self.sound = Sound(self)
         self.pathfinding = PathFinding(self)
+        self.resolution = ResolutionScaler(self)
         self.pause_menu = PauseMenu(self)
         pg.mixer.music.play(-1)
 
+    def restart(self):
+        # map, assets, sounds and the path graph outlive a round, only what play changes is reset
+        self.player.reset()
+        self.object_handler.reset()
+        self.weapon.reset()
+        self.raycasting.cast_pose = None
+
+    def end_round(self, result):
+        # the rest of the frame still runs against the finished round, the next update restarts it
+        if self.round_over is None:
+            self.round_over = result
+
+    def finish_round(self):
+        if self.round_over == 'won':
+            self.object_renderer.win()
+        else:
+            self.object_renderer.game_over()
+        self.object_renderer.draw_final_score(self.player.score)
+        pg.display.flip()
+        self.wait_for_restart()
+        self.round_over = None
+        self.restart()
+
     def update(self):
+        if self.round_over:
+            self.finish_round()
         # Only update game if not paused
         if not self.pause_menu.is_paused:
+            # everything read from outside the game this frame, replayed from the log when there is one
+            frame = self.input.poll()
+            self.delta_time = frame.delta_time
+            self.global_trigger = frame.global_trigger
+            self.time += self.delta_time
+            self.animation_clock.update()
+
+            if frame.fire:
+                self.player.fire()
+
             # Hand gesture → Rotate player view
-            if self.virtual_mouse.index_coords:
-                dx = (self.virtual_mouse.index_coords[0] - self.virtual_mouse.prev_index_x) * 0.005
-                self.player.angle -= dx  # Fix: match hand movement to camera direction
-                self.virtual_mouse.prev_index_x = self.virtual_mouse.index_coords[0]
+            if frame.index:
+                self.player.angle -= frame.index_rel * 0.005  # Fix: match hand movement to camera direction
 
             # Hand gesture → Fire weapon
-            if self.virtual_mouse.gun_flag:
-                if not self.player.shot and not self.weapon.reloading:
-                    self.player.shot = True
-                    self.weapon.fire()
+            if frame.gun:
+                self.player.fire()
             else:
                 self.player.shot = False  # Reset shot flag when gesture ends
 
-            self.player.update()
-            self.raycasting.update()
+            profiler = self.profiler
+            with profiler.span('player.update'):
+                self.player.update()
+            with profiler.span('map.update'):
+                self.map.update()
+            with profiler.span('raycasting.update'):
+                self.raycasting.update()
+            self.simulate()
             self.object_handler.update()
-            self.weapon.update()
+            with profiler.span('weapon.update'):
+                self.weapon.update()
         
         pg.display.flip()
-        self.delta_time = self.clock.tick(FPS)
+        self.tick()
+        self.resolution.update()
         pg.display.set_caption(f'{self.clock.get_fps():.1f}')
 
 
+    def simulate(self):
+        # as many fixed steps as game time has moved on since the last one
+        self.step_trigger = self.step_trigger or self.global_trigger
+        steps = 0
+        while self.time - self.sim_time >= SIM_STEP_MS:
+            if steps == SIM_MAX_STEPS:
+                self.sim_time = self.time - (self.time - self.sim_time) % SIM_STEP_MS
+                break
+            self.sim_time += SIM_STEP_MS
+            self.step()
+            steps += 1
+        self.sim_alpha = (self.time - self.sim_time) / SIM_STEP_MS
+
+    def step(self):
+        self.player.recover_health()
+        if not self.object_handler.ai_worker:
+            # with the worker the distance field here is only brought up to date for NPCs it has no answer for
+            with self.profiler.span('pathfinding.update'):
+                self.pathfinding.update()
+        self.object_handler.step()
+        self.step_trigger = False
+
+    def tick(self):
+        self.delta_time = self.clock.tick(FPS)
+
+    def wait_for_restart(self):
+        if isinstance(self.input, InputReplayer):
+            return
+        waiting = True
+        while waiting:
+            for event in pg.event.get():
+                if event.type == pg.KEYDOWN:
+                    if event.key == pg.K_RETURN or event.key == pg.K_r:  # Press Enter or R to restart
+                        waiting = False
+            pg.time.delay(100)  # Small delay to avoid CPU overuse
+
     def draw(self):
-        self.object_renderer.draw()
-        self.weapon.draw()
+        profiler = self.profiler
+        with profiler.span('object_renderer.draw'):
+            self.object_renderer.draw()
+        with profiler.span('weapon.draw'):
+            self.weapon.draw()
         
-        # Apply brightness overlay if needed
-        self.pause_menu.apply_brightness(self.screen)
-        
-        # Draw pause menu if paused
-        self.pause_menu.draw(self.screen)
+        with profiler.span('pause_menu'):
+            # Apply brightness overlay if needed
+            self.pause_menu.apply_brightness(self.screen)
+
+            # Draw pause menu if paused
+            self.pause_menu.draw(self.screen)
+
+        profiler.draw()
+        profiler.end_frame()
 
     def check_events(self):
         self.global_trigger = False
         for event in pg.event.get():
             if event.type == pg.QUIT:
+                self.close()
                 pg.quit()
                 sys.exit()
             elif event.type == pg.KEYDOWN and event.key == pg.K_ESCAPE:
@@ -95,20 +216,35 @@ class Game:
             elif event.type == self.global_event:
                 self.global_trigger = True
             
+            self.profiler.handle_event(event)
+
             # Handle pause menu events
             self.pause_menu.handle_events(event)
             
             # Only handle player events if not paused
             if not self.pause_menu.is_paused:
-                self.player.single_fire_event(event)
+                self.input.handle_event(event)
 
     def run(self):
-        while True:
+        while not self.input.finished:
             self.check_events()
             self.update()
             self.draw()
+        self.close()
+
+    def close(self):
+        self.input.close()
+        self.object_handler.close()
 
 
 if __name__ == '__main__':
-    game = Game()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--record', metavar='PATH', help='write the session input to PATH')
+    parser.add_argument('--replay', metavar='PATH', help='play back a session recorded with --record')
+    parser.add_argument('--ai-worker', action='store_true', default=AI_WORKER,
+                        help='work out NPC line of sight and paths in a worker process, not with --record or --replay')
+    args = parser.parse_args()
+
+    game = Game(seed=args.seed, record_path=args.record, replay_path=args.replay, use_ai_worker=args.ai_worker)
     game.run()
@@ -1,4 +1,9 @@
 import pygame as pg
+import numpy as np
+import os
+from collections import OrderedDict
+from settings import *
+from map_format import MapFile
 
 _ = False
 mini_map = [
@@ -37,21 +42,135 @@ mini_map = [
 ]
 
 
+# texture id reported for tiles outside the map, so they block like walls
+OUT_OF_BOUNDS = 1
+# the eight tiles around a tile, in the order the path search walks them
+NEIGHBOURS = (-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (1, -1), (1, 1), (-1, 1)
+
+
 class Map:
     def __init__(self, game):
         self.game = game
-        self.mini_map = mini_map
-        self.world_map = {}
-        self.rows = len(self.mini_map)
-        self.cols = len(self.mini_map[0])
-        self.get_map()
-
-    def get_map(self):
-        for j, row in enumerate(self.mini_map):
-            for i, value in enumerate(row):
-                if value:
-                    self.world_map[(i, j)] = value
+        self.map_file = self.load_map_file()
+        self.version = 0  # bumped by set_tile, so cached ray casts, paths and the AI worker's grid are dropped
+        self.rows = self.map_file.rows
+        self.cols = self.map_file.cols
+        self.chunk_size = self.map_file.chunk_size
+        # decoded chunks, least recently used first
+        self.chunks = OrderedDict()
+        # tiles changed by set_tile, {(chunk x, chunk y): {index in the chunk: tile}}, laid over chunks read again
+        self.edits = {}
+        # dense row-major tile ids of the chunks around the player, 0 is empty; grid_array is a
+        # numpy view of the same memory and (grid_x, grid_y) the map position of its first tile
+        self.grid_chunk = None
+        self.get_map(*PLAYER_POS)
+
+    @staticmethod
+    def load_map_file():
+        if os.path.exists(MAP_PATH):
+            return MapFile.open(MAP_PATH)
+        return MapFile.from_rows(mini_map, MAP_CHUNK_SIZE)
+
+    def get_chunk(self, cx, cy):
+        chunk = self.chunks.get((cx, cy))
+        if chunk is None:
+            chunk = self.chunks[(cx, cy)] = self.map_file.read_chunk(cx, cy)
+            for index, tile in self.edits.get((cx, cy), {}).items():
+                chunk[index] = tile
+        else:
+            self.chunks.move_to_end((cx, cy))
+        return chunk
+
+    def evict_chunks(self):
+        while len(self.chunks) > MAP_MAX_RESIDENT_CHUNKS:
+            self.chunks.popitem(last=False)
+
+    def get_map(self, x, y):
+        size = self.chunk_size
+        self.grid_chunk = px, py = int(x) // size, int(y) // size
+        cx0, cy0 = max(px - MAP_RESIDENT_RADIUS, 0), max(py - MAP_RESIDENT_RADIUS, 0)
+        cx1 = min(px + MAP_RESIDENT_RADIUS, self.map_file.chunks_x - 1)
+        cy1 = min(py + MAP_RESIDENT_RADIUS, self.map_file.chunks_y - 1)
+
+        grid_x, grid_y = cx0 * size, cy0 * size
+        cols = min((cx1 + 1) * size, self.cols) - grid_x
+        rows = min((cy1 + 1) * size, self.rows) - grid_y
+        grid = bytearray(rows * cols)
+        for cy in range(cy0, cy1 + 1):
+            for cx in range(cx0, cx1 + 1):
+                chunk = self.get_chunk(cx, cy)
+                x0, y0 = cx * size - grid_x, cy * size - grid_y
+                width = min(size, cols - x0)
+                for j in range(min(size, rows - y0)):
+                    start = (y0 + j) * cols + x0
+                    grid[start:start + width] = chunk[j * size:j * size + width]
+        self.set_grid(grid_x, grid_y, cols, rows, grid)
+        self.evict_chunks()
+
+    def set_grid(self, grid_x, grid_y, cols, rows, grid):
+        # grid becomes the resident window, also how the AI worker takes on the game's
+        self.grid_x, self.grid_y, self.grid_cols, self.grid_rows = grid_x, grid_y, cols, rows
+        self.grid = grid
+        self.grid_array = np.frombuffer(self.grid, dtype=np.uint8).reshape(rows, cols)
+        # NEIGHBOURS with their offsets in grid, for get_open_neighbours
+        self.neighbour_offsets = [(dx, dy, dy * cols + dx) for dx, dy in NEIGHBOURS]
+
+    def get_tile(self, x, y):
+        gx, gy = x - self.grid_x, y - self.grid_y
+        if 0 <= gx < self.grid_cols and 0 <= gy < self.grid_rows:
+            return self.grid[gy * self.grid_cols + gx]
+        if 0 <= x < self.cols and 0 <= y < self.rows:
+            size = self.chunk_size
+            tile = self.get_chunk(x // size, y // size)[y % size * size + x % size]
+            self.evict_chunks()
+            return tile
+        return OUT_OF_BOUNDS
+
+    def get_tiles(self, x, y):
+        """get_tile for arrays of tile coordinates."""
+        gx, gy = x - self.grid_x, y - self.grid_y
+        inside = (gx >= 0) & (gx < self.grid_cols) & (gy >= 0) & (gy < self.grid_rows)
+        tiles = self.grid_array.take(np.where(inside, gy * self.grid_cols + gx, 0))
+        for i in np.flatnonzero(~inside):
+            tiles[i] = self.get_tile(int(x[i]), int(y[i]))
+        return tiles
+
+    def is_wall(self, x, y):
+        # the resident window test of get_tile inlined, it answers nearly every probe
+        gx, gy = x - self.grid_x, y - self.grid_y
+        if 0 <= gx < self.grid_cols and 0 <= gy < self.grid_rows:
+            return self.grid[gy * self.grid_cols + gx] != 0
+        return self.get_tile(x, y) != 0
+
+    def get_open_neighbours(self, x, y):
+        """The NEIGHBOURS of tile x, y that are not walls."""
+        gx, gy = x - self.grid_x, y - self.grid_y
+        if 0 < gx < self.grid_cols - 1 and 0 < gy < self.grid_rows - 1:
+            # all eight are in the resident window: index it directly
+            grid, i = self.grid, gy * self.grid_cols + gx
+            return [(x + dx, y + dy) for dx, dy, offset in self.neighbour_offsets if not grid[i + offset]]
+        is_wall = self.is_wall
+        return [(x + dx, y + dy) for dx, dy, _ in self.neighbour_offsets if not is_wall(x + dx, y + dy)]
+
+    def set_tile(self, x, y, tile):
+        """Change a tile while the game runs, 0 to clear it; anything cached from the old map is dropped."""
+        if not (0 <= x < self.cols and 0 <= y < self.rows):
+            raise ValueError(f'tile {x}, {y} is outside the map')
+        size = self.chunk_size
+        key, index = (x // size, y // size), y % size * size + x % size
+        self.edits.setdefault(key, {})[index] = tile
+        if key in self.chunks:
+            self.chunks[key][index] = tile
+        gx, gy = x - self.grid_x, y - self.grid_y
+        if 0 <= gx < self.grid_cols and 0 <= gy < self.grid_rows:
+            self.grid[gy * self.grid_cols + gx] = tile
+        self.version += 1
+
+    def update(self):
+        x, y = self.game.player.map_pos
+        if (x // self.chunk_size, y // self.chunk_size) != self.grid_chunk:
+            self.get_map(x, y)
 
     def draw(self):
-        [pg.draw.rect(self.game.screen, 'darkgray', (pos[0] * 100, pos[1] * 100, 100, 100), 2)
-         for pos in self.world_map]
\ No newline at end of file
+        [pg.draw.rect(self.game.screen, 'darkgray', ((self.grid_x + i) * 100, (self.grid_y + j) * 100, 100, 100), 2)
+         for j in range(self.grid_rows) for i in range(self.grid_cols) if self.grid[j * self.grid_cols + i]]
@@ -0,0 +1,91 @@
+import mmap
+import struct
+
+# file layout: header, one (offset, length) index entry per chunk in row-major chunk order,
+# then every chunk's tiles run-length encoded as (count, tile id) byte pairs
+MAGIC = b'DMAP'
+VERSION = 1
+HEADER = struct.Struct('<4sHIIH')  # magic, version, cols, rows, chunk size
+INDEX_ENTRY = struct.Struct('<II')  # chunk data offset, length
+
+
+def encode_chunk(tiles):
+    data = bytearray()
+    run_value, run_length = tiles[0], 0
+    for value in tiles:
+        if value != run_value or run_length == 255:
+            data += bytes((run_length, run_value))
+            run_value, run_length = value, 0
+        run_length += 1
+    data += bytes((run_length, run_value))
+    return bytes(data)
+
+
+def decode_chunk(data):
+    tiles = bytearray()
+    for i in range(0, len(data), 2):
+        tiles += data[i + 1:i + 2] * data[i]
+    return tiles
+
+
+def encode_map(rows, chunk_size):
+    num_rows, num_cols = len(rows), len(rows[0])
+    chunks_x, chunks_y = -(-num_cols // chunk_size), -(-num_rows // chunk_size)
+
+    chunks = []
+    for cy in range(chunks_y):
+        for cx in range(chunks_x):
+            # tiles past the map edge are padding, Map never reads them
+            tiles = bytearray(chunk_size * chunk_size)
+            for j in range(chunk_size):
+                y = cy * chunk_size + j
+                if y < num_rows:
+                    row = rows[y][cx * chunk_size:(cx + 1) * chunk_size]
+                    tiles[j * chunk_size:j * chunk_size + len(row)] = bytes(int(value) for value in row)
+            chunks.append(encode_chunk(tiles))
+
+    data = bytearray(HEADER.pack(MAGIC, VERSION, num_cols, num_rows, chunk_size))
+    offset = len(data) + INDEX_ENTRY.size * len(chunks)
+    for chunk in chunks:
+        data += INDEX_ENTRY.pack(offset, len(chunk))
+        offset += len(chunk)
+    for chunk in chunks:
+        data += chunk
+    return bytes(data)
+
+
+def save_map(path, rows, chunk_size):
+    with open(path, 'wb') as file:
+        file.write(encode_map(rows, chunk_size))
+
+
+class MapFile:
+    """Random access to the chunks of an encoded map, without reading the whole file."""
+    def __init__(self, data):
+        self.data = data
+        magic, version, self.cols, self.rows, self.chunk_size = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'not a version {VERSION} map file')
+        self.chunks_x = -(-self.cols // self.chunk_size)
+        self.chunks_y = -(-self.rows // self.chunk_size)
+
+    @classmethod
+    def open(cls, path):
+        with open(path, 'rb') as file:
+            return cls(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+
+    @classmethod
+    def from_rows(cls, rows, chunk_size):
+        return cls(encode_map(rows, chunk_size))
+
+    def read_chunk(self, cx, cy):
+        offset, length = INDEX_ENTRY.unpack_from(self.data, HEADER.size + INDEX_ENTRY.size * (cy * self.chunks_x + cx))
+        return decode_chunk(self.data[offset:offset + length])
+
+
+if __name__ == '__main__':
+    from settings import MAP_PATH, MAP_CHUNK_SIZE
+    from map import mini_map
+
+    save_map(MAP_PATH, mini_map, MAP_CHUNK_SIZE)
+    print(f'wrote {MAP_PATH}')
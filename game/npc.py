@@ -1,21 +1,36 @@
 from sprite_object import *
+from npc_arrays import NPCArrays, ArrayField, PAIN, ATTACK, WALK, IDLE
 from random import randint, random
 
 
 class NPC(AnimatedSprite):
+    # kept in a row of NPCArrays, so movement and distance are worked out for every NPC at once
+    x, y, prev_x, prev_y = map(ArrayField, ('x', 'y', 'prev_x', 'prev_y'))
+    speed, size = ArrayField('speed'), ArrayField('size')
+    step_x, step_y, moving, ticks = map(ArrayField, ('step_x', 'step_y', 'moving', 'ticks'))
+    dx, dy, theta, dist = map(ArrayField, ('dx', 'dy', 'theta', 'dist'))
+    health, attack_dist, alive, pain = map(ArrayField, ('health', 'attack_dist', 'alive', 'pain'))
+    ray_cast_value, player_search_trigger = map(ArrayField, ('ray_cast_value', 'player_search_trigger'))
+    frame_counter, death_frames, logic_tick = map(ArrayField, ('frame_counter', 'death_frames', 'logic_tick'))
+
     def __init__(self, game, path='resources/sprites/npc/soldier/0.png', pos=(10.5, 5.5),
                  scale=0.6, shift=0.38, animation_time=180):
+        # a row of its own until ObjectHandler.add_npc moves it into the shared arrays
+        self.arrays, self.index = None, None
+        NPCArrays().add(self)
         super().__init__(game, path, pos, scale, shift, animation_time)
         self.attack_images = self.get_images(self.path + '/attack')
         self.death_images = self.get_images(self.path + '/death')
         self.idle_images = self.get_images(self.path + '/idle')
         self.pain_images = self.get_images(self.path + '/pain')
         self.walk_images = self.get_images(self.path + '/walk')
+        self.death_frames = len(self.death_images)
+        self.prev_x, self.prev_y = self.x, self.y
 
         self.attack_dist = randint(3, 6)
         self.speed = 0.03
         self.size = 20
-        self.health = 100
+        self.health = self.max_health = 100
         self.attack_damage = 10
         self.accuracy = 0.15
         self.alive = True
@@ -24,31 +39,38 @@ class NPC(AnimatedSprite):
         self.frame_counter = 0
         self.player_search_trigger = False
 
-
-    def update(self):
-        self.check_animation_time()
-        self.get_sprite()
-        self.run_logic()
+    def reset(self, pos):
+        self.x, self.y = self.prev_x, self.prev_y = pos
+        self.health = self.max_health
+        self.alive = True
+        self.pain = False
+        self.ray_cast_value = False
+        self.frame_counter = 0
+        self.player_search_trigger = False
+        self.logic_tick = -1
+        self.reset_animation()
+        self.game.object_handler.spatial_index.move(self)
+
+    def update(self, screen_x, norm_dist):
+        # screen_x and norm_dist come from NPCArrays.project, run for every NPC beforehand
+        if self.in_view:
+            self.place(screen_x, norm_dist)
+        else:
+            self.sprite_half_width = 0
         # self.draw_ray_cast()
 
-    def check_wall(self, x, y):
-        return (x, y) not in self.game.map.world_map
-
-    def check_wall_collision(self, dx, dy):
-        if self.check_wall(int(self.x + dx * self.size), int(self.y)):
-            self.x += dx
-        if self.check_wall(int(self.x), int(self.y + dy * self.size)):
-            self.y += dy
+    def update_logic(self, state):
+        # run by ObjectHandler.ai_scheduler, which sets ticks and logic_tick for every NPC it ran afterwards
+        self.check_animation_time()
+        self.run_logic(state)
 
     def movement(self):
-        next_pos = self.game.pathfinding.get_path(self.map_pos, self.game.player.map_pos)
-        next_x, next_y = next_pos
+        next_pos = self.game.object_handler.get_next_step(self)
 
         if next_pos not in self.game.object_handler.npc_positions:
-            angle = math.atan2(next_y + 0.5 - self.y, next_x + 0.5 - self.x)
-            dx = math.cos(angle) * self.speed
-            dy = math.sin(angle) * self.speed
-            self.check_wall_collision(dx, dy)
+            # the step is taken with every other NPC's in NPCArrays.move
+            self.step_x, self.step_y = next_pos
+            self.moving = True
 
     def attack(self):
         if self.animation_trigger:
@@ -58,29 +80,21 @@ class NPC(AnimatedSprite):
 
     def animate_death(self):
         if not self.alive:
-            if self.game.global_trigger and self.frame_counter < len(self.death_images) - 1:
-                self.death_images.rotate(-1)
-                self.image = self.death_images[0]
+            if self.game.step_trigger and self.frame_counter < self.death_frames - 1:
                 self.frame_counter += 1
+                self.image = self.death_images[self.frame_counter]
 
     def animate_pain(self):
         self.animate(self.pain_images)
         if self.animation_trigger:
             self.pain = False
 
-    def check_hit_in_npc(self):
-        if self.ray_cast_value and self.game.player.shot:
-            if HALF_WIDTH - self.sprite_half_width < self.screen_x < HALF_WIDTH + self.sprite_half_width:
-                # Check weapon range
-                if self.dist <= self.game.weapon.range:
-                    self.game.sound.npc_pain.play()
-                    self.game.player.shot = False
-                    self.pain = True
-                    self.health -= self.game.weapon.damage
-                    self.check_health()
-                else:
-                    # Out of range - reset shot without dealing damage
-                    self.game.player.shot = False
+    def get_damage(self, damage):
+        # hit by the player, see Weapon.get_target
+        self.game.sound.npc_pain.play()
+        self.pain = True
+        self.health -= damage
+        self.check_health()
 
     def check_health(self):
         if self.health < 1 and self.alive:
@@ -89,30 +103,23 @@ class NPC(AnimatedSprite):
             # 🏆 Add score when killed
             self.game.player.add_score(self.kill_score)
 
-    def run_logic(self):
-        if self.alive:
-            self.ray_cast_value = self.ray_cast_player_npc()
-            self.check_hit_in_npc()
-
-            if self.pain:
-                self.animate_pain()
+    def run_logic(self, state):
+        # state is the branch NPCArrays.get_logic_states picked from alive, pain, ray_cast_value, dist and
+        # player_search_trigger; the scheduler sets player_search_trigger for the ATTACK and WALK ones
+        if state == PAIN:
+            self.animate_pain()
 
-            elif self.ray_cast_value:
-                self.player_search_trigger = True
+        elif state == ATTACK:
+            self.animate(self.attack_images)
+            self.attack()
 
-                if self.dist < self.attack_dist:
-                    self.animate(self.attack_images)
-                    self.attack()
-                else:
-                    self.animate(self.walk_images)
-                    self.movement()
+        elif state == WALK:
+            self.animate(self.walk_images)
+            self.movement()
 
-            elif self.player_search_trigger:
-                self.animate(self.walk_images)
-                self.movement()
+        elif state == IDLE:
+            self.animate(self.idle_images)
 
-            else:
-                self.animate(self.idle_images)
         else:
             self.animate_death()
 
@@ -129,6 +136,8 @@ class NPC(AnimatedSprite):
 
         ox, oy = self.game.player.pos
         x_map, y_map = self.game.player.map_pos
+        npc_x, npc_y = self.map_pos
+        get_tile = self.game.map.get_tile
 
         ray_angle = self.theta
 
@@ -145,11 +154,11 @@ class NPC(AnimatedSprite):
         dx = delta_depth * cos_a
 
         for i in range(MAX_DEPTH):
-            tile_hor = int(x_hor), int(y_hor)
-            if tile_hor == self.map_pos:
+            x, y = int(x_hor), int(y_hor)
+            if x == npc_x and y == npc_y:
                 player_dist_h = depth_hor
                 break
-            if tile_hor in self.game.map.world_map:
+            if get_tile(x, y):
                 wall_dist_h = depth_hor
                 break
             x_hor += dx
@@ -166,11 +175,11 @@ class NPC(AnimatedSprite):
         dy = delta_depth * sin_a
 
         for i in range(MAX_DEPTH):
-            tile_vert = int(x_vert), int(y_vert)
-            if tile_vert == self.map_pos:
+            x, y = int(x_vert), int(y_vert)
+            if x == npc_x and y == npc_y:
                 player_dist_v = depth_vert
                 break
-            if tile_vert in self.game.map.world_map:
+            if get_tile(x, y):
                 wall_dist_v = depth_vert
                 break
             x_vert += dx
@@ -203,7 +212,7 @@ class CacoDemonNPC(NPC):
                  scale=0.7, shift=0.27, animation_time=250):
         super().__init__(game, path, pos, scale, shift, animation_time)
         self.attack_dist = 1.0
-        self.health = 150
+        self.health = self.max_health = 150
         self.attack_damage = 25
         self.speed = 0.05
         self.accuracy = 0.35
@@ -215,7 +224,7 @@ class CyberDemonNPC(NPC):
                  scale=1.0, shift=0.04, animation_time=210):
         super().__init__(game, path, pos, scale, shift, animation_time)
         self.attack_dist = 6
-        self.health = 350
+        self.health = self.max_health = 350
         self.attack_damage = 15
         self.speed = 0.055
         self.accuracy = 0.25
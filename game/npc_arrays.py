@@ -0,0 +1,139 @@
+import numpy as np
+from settings import *
+
+# column -> dtype, value for a new NPC
+COLUMNS = {
+    # position and movement
+    'x': (np.float64, 0),
+    'y': (np.float64, 0),
+    'prev_x': (np.float64, 0),  # where the NPC was drawn when its last move started, drawing goes on from it
+    'prev_y': (np.float64, 0),
+    'move_step': (np.int64, -1),  # NPCArrays.step of the last move
+    'move_span': (np.intp, 1),  # steps drawing takes to go from prev to x, the ticks that move covered
+    'speed': (np.float64, 0),
+    'size': (np.float64, 0),
+    'step_x': (np.intp, 0),  # tile the NPC heads for when moving is set
+    'step_y': (np.intp, 0),
+    'moving': (np.bool_, False),
+    'ticks': (np.intp, 1),  # steps the current logic update covers
+    # relative to the player, from locate
+    'dx': (np.float64, 0),
+    'dy': (np.float64, 0),
+    'theta': (np.float64, 0),
+    'dist': (np.float64, 1),
+    # state
+    'health': (np.int64, 0),
+    'attack_dist': (np.float64, 0),
+    'alive': (np.bool_, True),
+    'pain': (np.bool_, False),
+    'ray_cast_value': (np.bool_, False),
+    'player_search_trigger': (np.bool_, False),
+    'frame_counter': (np.intp, 0),
+    'death_frames': (np.intp, 0),
+    'logic_tick': (np.int64, -1),  # AIScheduler tick of the last logic update, -1 before the first
+}
+
+# NPC.run_logic branches, picked for many NPCs at once by NPCArrays.get_logic_states
+DEATH, PAIN, ATTACK, WALK, IDLE = range(5)
+
+
+class ArrayField:
+    """An NPC attribute kept in the NPC's row of the NPCArrays column of the same name."""
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, npc, owner=None):
+        if npc is None:
+            return self
+        return getattr(npc.arrays, self.name)[npc.index].item()
+
+    def __set__(self, npc, value):
+        getattr(npc.arrays, self.name)[npc.index] = value
+
+
+class NPCArrays:
+    """The state of many NPCs as one array per attribute, row npc.index holding that NPC's values."""
+    def __init__(self):
+        self.count = 0
+        self.step = 0  # simulation steps started, counted by start_step
+        # whole column buffers, the attribute of the same name is a view of their first count rows
+        self.buffers = {name: np.empty(0, dtype) for name, (dtype, _) in COLUMNS.items()}
+        self.set_views()
+
+    def set_views(self):
+        for name, buffer in self.buffers.items():
+            setattr(self, name, buffer[:self.count])
+
+    def add(self, npc):
+        if self.count == len(self.buffers['x']):
+            # doubled when full, so adding n NPCs copies O(n) rows in all
+            for name, buffer in self.buffers.items():
+                self.buffers[name] = np.concatenate((buffer, np.empty(max(len(buffer), 1), buffer.dtype)))
+        # the NPC's row moves over from the arrays it was created with
+        for name, (_, default) in COLUMNS.items():
+            value = default if npc.arrays is None else getattr(npc.arrays, name)[npc.index]
+            self.buffers[name][self.count] = value
+        npc.arrays, npc.index = self, self.count
+        self.count += 1
+        self.set_views()
+
+    def start_step(self):
+        self.step += 1
+
+    def get_drawn_positions(self, alpha, rows=slice(None)):
+        # an NPC that ran its logic every ticks steps moves ticks steps at once, so it is drawn going
+        # from prev to x over that many steps rather than one
+        progress = np.minimum((self.step - self.move_step[rows] + alpha) / self.move_span[rows], 1)
+        prev_x, prev_y = self.prev_x[rows], self.prev_y[rows]
+        return prev_x + (self.x[rows] - prev_x) * progress, prev_y + (self.y[rows] - prev_y) * progress
+
+    def locate(self, px, py, alpha=None):
+        """Direction and distance from the player to every NPC, as SpriteObject.locate. With alpha, from
+        where they are drawn that far between the last step and the next."""
+        x, y = self.x, self.y
+        if alpha is not None:
+            x, y = self.get_drawn_positions(alpha)
+        np.subtract(x, px, out=self.dx)
+        np.subtract(y, py, out=self.dy)
+        np.arctan2(self.dy, self.dx, out=self.theta)
+        np.hypot(self.dx, self.dy, out=self.dist)
+
+    def project(self, angle):
+        """Screen x and distance along the view direction of every NPC, as SpriteObject.project."""
+        delta = self.theta - angle
+        delta[(self.dx > 0) & (angle > math.pi) | (self.dx < 0) & (self.dy < 0)] += math.tau
+        return (HALF_NUM_RAYS + delta / DELTA_ANGLE) * SCALE, self.dist * np.cos(delta)
+
+    def get_logic_states(self, rows):
+        """The NPC.run_logic branch each of rows takes this step."""
+        seen = self.ray_cast_value[rows]
+        attack = seen & (self.dist[rows] < self.attack_dist[rows])
+        walk = seen | self.player_search_trigger[rows]
+        return np.select((~self.alive[rows], self.pain[rows], attack, walk), (DEATH, PAIN, ATTACK, WALK), IDLE)
+
+    def get_map_positions(self):
+        alive = self.alive
+        return set(zip(self.x[alive].astype(np.intp).tolist(), self.y[alive].astype(np.intp).tolist()))
+
+    def move(self, game_map):
+        """Step every NPC with moving set towards the centre of its step tile; returns the rows moved."""
+        rows = np.flatnonzero(self.moving)
+        if not len(rows):
+            return rows
+        self.moving[rows] = False
+        x, y, ticks, size = self.x[rows], self.y[rows], self.ticks[rows], self.size[rows]
+        angle = np.arctan2(self.step_y[rows] + 0.5 - y, self.step_x[rows] + 0.5 - x)
+        dx = np.cos(angle) * self.speed[rows]
+        dy = np.sin(angle) * self.speed[rows]
+
+        # the walls are probed size frames of movement ahead, further than the ticks of steps moved at once
+        ticks = ticks * NPC_STEP_SCALE
+        free = game_map.get_tiles((x + dx * size).astype(np.intp), y.astype(np.intp)) == 0
+        x = np.where(free, x + dx * ticks, x)
+        free = game_map.get_tiles(x.astype(np.intp), (y + dy * size).astype(np.intp)) == 0
+        y = np.where(free, y + dy * ticks, y)
+        # drawing starts over from where the NPC is drawn at the end of the last step
+        self.prev_x[rows], self.prev_y[rows] = self.get_drawn_positions(0, rows)
+        self.move_step[rows], self.move_span[rows] = self.step, self.ticks[rows]
+        self.x[rows], self.y[rows] = x, y
+        return rows
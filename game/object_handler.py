@@ -1,5 +1,12 @@
+import numpy as np
 from sprite_object import *
 from npc import *
+from spatial import SpatialGrid
+from line_of_sight import LineOfSight
+from ai_scheduler import AIScheduler
+from npc_arrays import NPCArrays
+from ai_worker import AIWorker
+from replay import LiveInput
 from random import choices, randrange
 
 
@@ -15,6 +22,11 @@ class ObjectHandler:
         add_sprite = self.add_sprite
         add_npc = self.add_npc
         self.npc_positions = {}
+        self.npc_arrays = NPCArrays()
+        self.spatial_index = SpatialGrid(SPATIAL_CELL_SIZE)
+        self.line_of_sight = LineOfSight(game)
+        self.ai_scheduler = AIScheduler(game)
+        self.view_margin = 0  # radians, how far past the FOV edge a sprite centre can still be on screen
 
         # spawn npc
         self.enemies = 20  # npc count
@@ -22,6 +34,8 @@ class ObjectHandler:
         self.weights = [70, 20, 10]
         self.restricted_area = {(i, j) for i in range(10) for j in range(10)}
         self.spawn_npc()
+        self.npc_positions = self.npc_arrays.get_map_positions()
+        self.ai_worker = self.start_ai_worker()
 
         # sprite map
         add_sprite(AnimatedSprite(game))
@@ -60,33 +74,100 @@ class ObjectHandler:
     def spawn_npc(self):
         for i in range(self.enemies):
                 npc = choices(self.npc_types, self.weights)[0]
-                pos = x, y = randrange(self.game.map.cols), randrange(self.game.map.rows)
-                while (pos in self.game.map.world_map) or (pos in self.restricted_area):
-                    pos = x, y = randrange(self.game.map.cols), randrange(self.game.map.rows)
-                self.add_npc(npc(self.game, pos=(x + 0.5, y + 0.5)))
+                self.add_npc(npc(self.game, pos=self.get_spawn_pos()))
+
+    def start_ai_worker(self):
+        if not getattr(self.game, 'use_ai_worker', AI_WORKER) or type(getattr(self.game, 'input', None)) is not LiveInput:
+            return None
+        try:
+            return AIWorker(self.game, self.npc_arrays.count)
+        except OSError:
+            # no shared memory or no processes here, everything stays in process
+            return None
+
+    def get_spawn_pos(self):
+        pos = x, y = randrange(self.game.map.cols), randrange(self.game.map.rows)
+        while self.game.map.is_wall(x, y) or (pos in self.restricted_area):
+            pos = x, y = randrange(self.game.map.cols), randrange(self.game.map.rows)
+        return x + 0.5, y + 0.5
+
+    def reset(self):
+        # the same NPCs, alive again at new spawn points
+        for npc in self.npc_list:
+            npc.reset(self.get_spawn_pos())
+        self.npc_positions = {npc.map_pos for npc in self.npc_list}
 
     def check_win(self):
         if not len(self.npc_positions):
-            self.game.object_renderer.win()
-            self.game.object_renderer.draw_final_score(self.game.player.score)
-            pg.display.flip()
-            waiting = True
-            while waiting:
-                for event in pg.event.get():
-                    if event.type == pg.KEYDOWN:
-                        if event.key == pg.K_RETURN or event.key == pg.K_r:  # Press Enter or R to restart
-                            waiting = False
-                pg.time.delay(100)  # Small delay to avoid CPU overuse
-            self.game.new_game()
+            self.game.end_round('won')
+
+    def step(self):
+        # NPC logic and movement, once per simulation step
+        npc_arrays = self.npc_arrays
+        self.npc_positions = npc_arrays.get_map_positions()
+        player = self.game.player
+        with self.game.profiler.span('object_handler.npc_logic'):
+            npc_arrays.start_step()
+            npc_arrays.locate(player.x, player.y)
+            urgent, due = self.ai_scheduler.get_due(npc_arrays)
+            rows = np.concatenate((urgent, due))
+            if self.ai_worker:
+                self.ai_worker.poll()
+                if self.ai_worker.running:
+                    rows = self.ai_worker.apply_line_of_sight(npc_arrays, rows)
+                else:
+                    self.ai_worker = None
+            self.line_of_sight.update(npc_arrays, rows)
+            self.ai_scheduler.run(self.npc_list, npc_arrays, urgent, due)
+            for row in npc_arrays.move(self.game.map).tolist():
+                self.spatial_index.move(self.npc_list[row])
+            if self.ai_worker:
+                self.ai_worker.submit(npc_arrays)
+
+    def get_next_step(self, npc):
+        # from the worker when it has an answer for the NPC's tile, else from the distance field here
+        pathfinding = self.game.pathfinding
+        if self.ai_worker:
+            next_pos = self.ai_worker.get_next_step(npc)
+            if next_pos is not None:
+                return next_pos
+            pathfinding.update()
+        return pathfinding.get_path(npc.map_pos, self.game.player.map_pos)
 
     def update(self):
-        self.npc_positions = {npc.map_pos for npc in self.npc_list if npc.alive}
-        [sprite.update() for sprite in self.sprite_list]
-        [npc.update() for npc in self.npc_list]
+        player = self.game.player
+        in_view = set(self.spatial_index.query_frustum(player.x, player.y, player.angle, HALF_FOV,
+                                                       SPRITE_VIEW_DIST, self.view_margin))
+        self.game.profiler.count('sprites_in_view', len(in_view))
+
+        with self.game.profiler.span('object_handler.sprites'):
+            for sprite in self.sprite_list:
+                sprite.in_view = sprite in in_view
+                sprite.update()
+        with self.game.profiler.span('object_handler.npcs'):
+            # drawn on their way to where their last move took them, projected to the screen all at once
+            self.npc_arrays.locate(player.x, player.y, self.game.sim_alpha)
+            screen_x, norm_dist = self.npc_arrays.project(player.angle)
+            for npc, x, dist in zip(self.npc_list, screen_x.tolist(), norm_dist.tolist()):
+                npc.in_view = npc in in_view
+                npc.update(x, dist)
         self.check_win()
 
+    def close(self):
+        if self.ai_worker:
+            self.ai_worker.close()
+            self.ai_worker = None
+
     def add_npc(self, npc):
         self.npc_list.append(npc)
+        self.npc_arrays.add(npc)
+        self.add_to_index(npc)
 
     def add_sprite(self, sprite):
-        self.sprite_list.append(sprite)
\ No newline at end of file
+        self.sprite_list.append(sprite)
+        self.add_to_index(sprite)
+
+    def add_to_index(self, sprite):
+        self.spatial_index.insert(sprite)
+        # get_sprite keeps sprites whose centre is up to IMAGE_HALF_WIDTH pixels off screen
+        self.view_margin = max(self.view_margin, sprite.IMAGE_HALF_WIDTH / SCALE * DELTA_ANGLE)
\ No newline at end of file
@@ -1,14 +1,23 @@
 import pygame as pg
+import numpy as np
 from settings import *
+from surface_cache import SurfaceCache
+from assets import assets
 
 
 class ObjectRenderer:
     def __init__(self, game):
         self.game = game
         self.screen = game.screen
+        self.wall_render_mode = WALL_RENDER_MODE
         self.wall_textures = self.load_wall_textures()
+        self.wall_texture_array = self.get_wall_texture_array()
+        self.sprite_cache = SurfaceCache(SPRITE_CACHE_MAX_BYTES)
         self.sky_image = self.get_texture('resources/textures/sky.png', (WIDTH, HALF_HEIGHT))
         self.sky_offset = 0
+        # background and walls of a reduced resolution frame, stretched to the screen once they are drawn
+        self.view = None
+        self.view_sky_image = None
         self.blood_screen = self.get_texture('resources/textures/blood_screen.png', RES)
         self.digit_size = 90
         # Load digits 0-9
@@ -31,7 +40,8 @@ class ObjectRenderer:
         self.screen.blit(self.game_over_image, (0, 0))
 
     def draw_player_health(self):
-        health = str(self.game.player.health)
+        # below 0 for the rest of the frame the player dies in, until the next update restarts the round
+        health = str(max(self.game.player.health, 0))
         for i, char in enumerate(health):
             self.screen.blit(self.digits[char], (i * self.digit_size, 0))
         self.screen.blit(self.digits['10'], ((i + 1) * self.digit_size, 0))
@@ -59,22 +69,99 @@ class ObjectRenderer:
     def player_damage(self):
         self.screen.blit(self.blood_screen, (0, 0))
 
+    def get_view(self):
+        # the surface background and walls are drawn into: the screen itself at full resolution
+        view_size = self.game.raycasting.view_size
+        if view_size == RES:
+            return self.screen
+        if self.view is None or self.view.get_size() != view_size:
+            self.view = pg.Surface(view_size, 0, self.screen)
+            self.view_sky_image = pg.transform.scale(self.sky_image, (view_size[0], view_size[1] // 2))
+        return self.view
+
     def draw_background(self):
         self.sky_offset = (self.sky_offset + 4.5 * self.game.player.rel) % WIDTH
-        self.screen.blit(self.sky_image, (-self.sky_offset, 0))
-        self.screen.blit(self.sky_image, (-self.sky_offset + WIDTH, 0))
+        view = self.get_view()
+        sky_image = self.sky_image if view is self.screen else self.view_sky_image
+        width, height = view.get_size()
+        sky_offset = self.sky_offset * (width / WIDTH)
+        view.blit(sky_image, (-sky_offset, 0))
+        view.blit(sky_image, (-sky_offset + width, 0))
         # floor
-        pg.draw.rect(self.screen, FLOOR_COLOR, (0, HALF_HEIGHT, WIDTH, HEIGHT))
+        pg.draw.rect(view, FLOOR_COLOR, (0, height // 2, width, height))
 
     def render_game_objects(self):
-        list_objects = sorted(self.game.raycasting.objects_to_render, key=lambda t: t[0], reverse=True)
+        # one blits() call for the frame: wall columns in screen order, they never overlap each other,
+        # then the visible spans of the sprites far to near. A span is always nearer than the wall
+        # under it, so merging walls and sprites by depth puts every sprite after the walls
+        render_queue = []
+        view = self.get_view()
+        if self.wall_render_mode == 'buffer':
+            self.draw_walls(view)
+        else:
+            render_queue += [(image, pos) for depth, image, pos in self.game.raycasting.wall_objects]
+        if view is not self.screen:
+            # a reduced resolution frame is stretched to the window in one go, sprites are drawn over it at full size
+            view.blits(render_queue, doreturn=False)
+            self.game.profiler.count('blits', len(render_queue))
+            render_queue = []
+            pg.transform.scale(view, RES, self.screen)
+
+        list_objects = sorted(self.game.raycasting.sprite_objects, key=lambda t: t[0], reverse=True)
         for depth, image, pos in list_objects:
-            self.screen.blit(image, pos)
+            render_queue += self.get_visible_spans(image, pos, depth)
+
+        self.screen.blits(render_queue, doreturn=False)
+        self.game.profiler.count('blits', len(render_queue))
+
+    def draw_walls(self, view):
+        depth, proj_height, texture, offset = self.game.raycasting.ray_casting_arrays
+        view_width, view_height = view.get_size()
+        height = np.maximum(proj_height.astype(np.int32), 1)
+        top = view_height // 2 - height // 2
+        first_row, last_row = max(int(top.min()), 0), min(int((top + height).max()), view_height)
+
+        # [screen row, ray] texel index, walked row by row so reads and writes stay in cache
+        texel = np.arange(first_row, last_row, dtype=np.int32)[:, None] - top
+        visible = texel < height
+        visible &= texel >= 0
+        # hidden rows are clamped into the strip as well, so the 16.16 step below stays under 1 << 24
+        np.clip(texel, 0, height - 1, out=texel)
+        texel *= (TEXTURE_SIZE << 16) // height
+        texel >>= 16
+        texel *= TEXTURE_SIZE
+        texel += texture.astype(np.int32) * TEXTURE_SIZE * TEXTURE_SIZE
+        scale = view_width // len(depth)
+        texel += (offset * (TEXTURE_SIZE - scale)).astype(np.int32)
+
+        pixels = pg.surfarray.pixels2d(view).T[first_row:last_row]
+        for i in range(scale):
+            np.copyto(pixels[:, i:len(depth) * scale:scale], self.wall_texture_array[texel + i], where=visible)
+        del pixels
+
+    def get_visible_spans(self, image, pos, depth):
+        # blits() entries for the runs of columns where the sprite is nearer than the wall
+        wall_depth = self.game.raycasting.depth_buffer
+        scale = WIDTH // len(wall_depth)
+        x, y = int(pos[0]), pos[1]
+        first, last = max(x, 0), min(x + image.get_width(), len(wall_depth) * scale)
+        if first >= last:
+            return []
+        visible = depth < wall_depth[np.arange(first, last) // scale]
+        edges = (np.flatnonzero(np.diff(np.concatenate(([False], visible, [False])))) + first).tolist()
+        height = image.get_height()
+        return [(image, (start, y), (start - x, 0, stop - start, height)) for start, stop in zip(edges[::2], edges[1::2])]
 
     @staticmethod
     def get_texture(path, res=(TEXTURE_SIZE, TEXTURE_SIZE)):
-        texture = pg.image.load(path).convert_alpha()
-        return pg.transform.scale(texture, res)
+        return assets.get_texture(path, res)
+
+    def get_wall_texture_array(self):
+        # flattened [texture id, y, x] texels already mapped to the screen pixel format
+        textures = np.zeros((max(self.wall_textures) + 1, TEXTURE_SIZE, TEXTURE_SIZE), dtype=np.uint32)
+        for texture_id, texture in self.wall_textures.items():
+            textures[texture_id] = pg.surfarray.array2d(texture.convert(self.screen)).T
+        return textures.ravel()
 
     def load_wall_textures(self):
         return {
@@ -1,47 +1,60 @@
 from collections import deque
-from functools import lru_cache
+from settings import *
+
+def get_distance_field(neighbours, goal, radius):
+    """Steps to goal from every tile at most radius steps away, by breadth first search."""
+    distances = {goal: 0}
+    queue = deque([goal])
+    while queue:
+        node = queue.popleft()
+        distance = distances[node] + 1
+        if distance > radius:
+            continue
+        for next_node in neighbours(node):
+            if next_node not in distances:
+                distances[next_node] = distance
+                queue.append(next_node)
+    return distances
+
+
+def get_next_step(distances, neighbours, start, goal, occupied):
+    # the first free neighbour a step nearer the goal; from outside the field head straight for it
+    distance = distances.get(start)
+    if distance is None or start == goal:
+        return goal
+    for next_node in neighbours(start):
+        if distances.get(next_node) == distance - 1 and next_node not in occupied:
+            return next_node
+    return start
 
 
 class PathFinding:
+    """One distance field towards the player, shared by every NPC."""
     def __init__(self, game):
         self.game = game
-        self.map = game.map.mini_map
-        self.ways = [-1, 0], [0, -1], [1, 0], [0, 1], [-1, -1], [1, -1], [1, 1], [-1, 1]
+        # filled in as the search reaches tiles, so it only grows with the explored area
         self.graph = {}
-        self.get_graph()
+        self.graph_version = None
+        self.goal = None
+        self.distances = {}
+
+    def get_neighbours(self, node):
+        next_nodes = self.graph.get(node)
+        if next_nodes is None:
+            next_nodes = self.graph[node] = self.game.map.get_open_neighbours(*node)
+        return next_nodes
+
+    def update(self):
+        # recomputed only when the player changes tile or the map changes
+        goal, version = self.game.player.map_pos, self.game.map.version
+        if version != self.graph_version:
+            self.graph.clear()
+        elif goal == self.goal:
+            return
+        self.goal, self.graph_version = goal, version
+        self.distances = get_distance_field(self.get_neighbours, goal, FLOW_FIELD_RADIUS)
+        self.game.profiler.count('bfs_nodes', len(self.distances))
 
-    @lru_cache
     def get_path(self, start, goal):
-        self.visited = self.bfs(start, goal, self.graph)
-        path = [goal]
-        step = self.visited.get(goal, start)
-
-        while step and step != start:
-            path.append(step)
-            step = self.visited[step]
-        return path[-1]
-
-    def bfs(self, start, goal, graph):
-        queue = deque([start])
-        visited = {start: None}
-
-        while queue:
-            cur_node = queue.popleft()
-            if cur_node == goal:
-                break
-            next_nodes = graph[cur_node]
-
-            for next_node in next_nodes:
-                if next_node not in visited and next_node not in self.game.object_handler.npc_positions:
-                    queue.append(next_node)
-                    visited[next_node] = cur_node
-        return visited
-
-    def get_next_nodes(self, x, y):
-        return [(x + dx, y + dy) for dx, dy in self.ways if (x + dx, y + dy) not in self.game.map.world_map]
-
-    def get_graph(self):
-        for y, row in enumerate(self.map):
-            for x, col in enumerate(row):
-                if not col:
-                    self.graph[(x, y)] = self.graph.get((x, y), []) + self.get_next_nodes(x, y)
\ No newline at end of file
+        return get_next_step(self.distances, self.get_neighbours, start, goal,
+                             self.game.object_handler.npc_positions)
@@ -7,43 +7,33 @@ import glm
 class Player:
     def __init__(self, game):
         self.game = game
+        self.health_recovery_delay = 10
+        self.diag_move_corr = 1 / math.sqrt(2)
+        self.reset()
+
+    def reset(self):
         self.x, self.y = PLAYER_POS
         self.angle = PLAYER_ANGLE
         self.shot = False
         self.health = PLAYER_MAX_HEALTH
         self.score = 0  # 🪙 Add score counter
         self.rel = 0
-        self.health_recovery_delay = 10
-        self.time_prev = pg.time.get_ticks()
-        self.diag_move_corr = 1 / math.sqrt(2)
+        self.time_prev = self.game.sim_time
 
     def recover_health(self):
         if self.check_health_recovery_delay() and self.health < PLAYER_MAX_HEALTH:
             self.health += 1
 
     def check_health_recovery_delay(self):
-        time_now = pg.time.get_ticks()
+        time_now = self.game.sim_time
         if time_now - self.time_prev > self.health_recovery_delay:
             self.time_prev = time_now
             return True
 
     def check_game_over(self):
         if self.health < 1:
-            # Show Game Over screen and final score
-            self.game.object_renderer.game_over()
-            self.game.object_renderer.draw_final_score(self.score)
-            pg.display.flip()
-
-            # Wait for player input to restart
-            waiting = True
-            while waiting:
-                for event in pg.event.get():
-                    if event.type == pg.KEYDOWN:
-                        if event.key == pg.K_RETURN or event.key == pg.K_r:  # Press Enter or R to restart
-                            waiting = False
-                pg.time.delay(100)  # Small delay to avoid CPU overuse
-
-            self.game.new_game()
+            # Game Over screen, final score and restart come at the start of the next frame
+            self.game.end_round('lost')
 
 
     def get_damage(self, damage):
@@ -56,11 +46,10 @@ class Player:
         """🏆 Add points to the score"""
         self.score += points
 
-    def single_fire_event(self, event):
-        if event.type == pg.MOUSEBUTTONDOWN:
-            if event.button == 1 and not self.shot and not self.game.weapon.reloading:
-                self.shot = True
-                self.game.weapon.fire()  # Fire currently equipped weapon
+    def fire(self):
+        if not self.shot and not self.game.weapon.reloading:
+            self.shot = True
+            self.game.weapon.fire()  # Fire currently equipped weapon
 
 
 
@@ -73,7 +62,7 @@ class Player:
         speed_sin = speed * sin_a
         speed_cos = speed * cos_a
 
-        keys = pg.key.get_pressed()
+        keys = self.game.input.get_pressed()
         num_key_pressed = -1
         if keys[pg.K_w]:
             num_key_pressed += 1
@@ -106,7 +95,9 @@ class Player:
         self.angle %= math.tau
 
     def check_wall(self, x, y):
-        return (x, y) not in self.game.map.world_map
+        # the probes are within a tile of the player, always inside the resident window: index it directly
+        game_map = self.game.map
+        return not game_map.grid[(y - game_map.grid_y) * game_map.grid_cols + x - game_map.grid_x]
 
     def check_wall_collision(self, dx, dy):
         scale = PLAYER_SIZE_SCALE / self.game.delta_time
@@ -116,17 +107,13 @@ class Player:
             self.y += dy
 
     def mouse_control(self):
-        mx, my = pg.mouse.get_pos()
-        if mx < MOUSE_BORDER_LEFT or mx > MOUSE_BORDER_RIGHT:
-            pg.mouse.set_pos([HALF_WIDTH, HALF_HEIGHT])
-        self.rel = pg.mouse.get_rel()[0]
+        self.rel = self.game.input.frame.mouse_rel
         self.rel = max(-MOUSE_MAX_REL, min(MOUSE_MAX_REL, self.rel))
         self.angle += self.rel * MOUSE_SENSITIVITY * self.game.delta_time
 
     def update(self):
         self.movement()
         self.mouse_control()
-        self.recover_health()
 
 
     @property
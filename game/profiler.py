@@ -0,0 +1,99 @@
+import csv
+import time
+import pygame as pg
+import numpy as np
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from settings import *
+
+
+class FrameProfiler:
+    """Per-stage frame timings and work counters over a rolling window of frames."""
+    def __init__(self, game):
+        self.game = game
+        self.show_overlay = False
+        self.font = pg.font.Font(None, 24)
+        self.frame = 0
+        self.spans = defaultdict(float)
+        self.counters = defaultdict(int)
+        # span names in the order they were first seen, each mapped to the 0 of a frame without it
+        self.span_names = {}
+        self.counter_names = set()
+        self.history = defaultdict(lambda: deque(maxlen=PROFILER_HISTORY))
+        self.rows = deque(maxlen=PROFILER_HISTORY)
+        self.frame_start = time.perf_counter()
+
+    @contextmanager
+    def span(self, name):
+        time_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans[name] += (time.perf_counter() - time_start) * 1000
+
+    def add_span(self, name, ms):
+        # time measured elsewhere, such as in another process
+        self.spans[name] += ms
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def end_frame(self):
+        time_now = time.perf_counter()
+        self.spans['total'] = (time_now - self.frame_start) * 1000
+        self.frame_start = time_now
+
+        # spans and counters seen before read 0 on frames that did none of that work,
+        # so every history window covers the same frames
+        self.span_names.update(dict.fromkeys(self.spans, 0.0))
+        self.counter_names.update(self.counters)
+        row = {'frame': self.frame, **self.span_names, **self.spans,
+               **dict.fromkeys(sorted(self.counter_names), 0), **self.counters}
+        for name, value in row.items():
+            self.history[name].append(value)
+        self.rows.append(row)
+        self.frame += 1
+        self.spans.clear()
+        self.counters.clear()
+
+    def get_histogram(self, name):
+        return np.histogram(self.history[name], bins=PROFILER_BINS, range=(0, PROFILER_MAX_MS))[0]
+
+    def dump_csv(self, path=PROFILER_CSV_PATH):
+        names = list(dict.fromkeys(name for row in self.rows for name in row))
+        with open(path, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=names, restval=0)
+            writer.writeheader()
+            writer.writerows(self.rows)
+
+    def handle_event(self, event):
+        if event.type == pg.KEYDOWN:
+            if event.key == pg.K_F3:
+                self.show_overlay = not self.show_overlay
+            elif event.key == pg.K_F4:
+                self.dump_csv()
+
+    def draw(self):
+        if not self.show_overlay or not self.rows:
+            return
+        screen = self.game.screen
+        x, y = 10, 110
+        bar_width, bar_height = 4, 20
+        last_row = self.rows[-1]
+        for name in last_row:
+            if name == 'frame':
+                continue
+            values = self.history[name]
+            if isinstance(last_row[name], int):  # work counter
+                text = f'{name}: {last_row[name]} (avg {np.mean(values):.0f})'
+            else:
+                text = f'{name}: {last_row[name]:.2f} ms (avg {np.mean(values):.2f}, p95 {np.percentile(values, 95):.2f})'
+                histogram = self.get_histogram(name)
+                peak = max(histogram.max(), 1)
+                for i, count in enumerate(histogram):
+                    height = bar_height * count // peak
+                    pg.draw.rect(screen, 'orange', (x + 440 + i * bar_width, y + bar_height - height, bar_width - 1, height))
+            screen.blit(self.font.render(text, True, 'white'), (x, y))
+            y += bar_height + 4
+        scale_text = f'render scale: {self.game.resolution.scale:.0%}'
+        screen.blit(self.font.render(scale_text, True, 'white'), (x, y))
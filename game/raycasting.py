@@ -1,46 +1,146 @@
 import pygame as pg
 import math
+import numpy as np
 from settings import *
+from surface_cache import SurfaceCache
+from map import OUT_OF_BOUNDS
 
 
 
 class RayCasting:
     def __init__(self, game):
         self.game = game
+        self.backend = RAY_CAST_BACKEND
         self.ray_casting_result = []
-        self.objects_to_render = []
+        self.ray_casting_arrays = None
+        self.raw_ray_arrays = None
+        self.wall_objects = []
+        self.sprite_objects = []
+        # per-ray wall depth, for clipping sprites column by column
+        self.depth_buffer = None
+        # last cast pose, for reusing rays across frames
+        self.cast_pose, self.cast_angle = None, 0
+        self.skipped_casts = 0
+        self.reused_rays = 0
         self.textures = self.game.object_renderer.wall_textures
+        self.column_cache = SurfaceCache(WALL_CACHE_MAX_BYTES)
+        self.set_resolution(NUM_RAYS)
+
+    def set_resolution(self, num_rays):
+        # fewer rays draw the walls SCALE pixels wide into a view as much smaller than the window,
+        # which ObjectRenderer stretches to it
+        self.num_rays = num_rays
+        self.scale = SCALE
+        self.view_size = self.view_width, self.view_height = num_rays * SCALE, HEIGHT * num_rays // NUM_RAYS
+        self.delta_angle = FOV / num_rays
+        self.column_cache.clear()
+        self.cast_pose = None
 
     def get_objects_to_render(self):
-        self.objects_to_render = []
+        self.wall_objects = []
         for ray, values in enumerate(self.ray_casting_result):
             depth, proj_height, texture, offset = values
 
-            if proj_height < HEIGHT:
-                wall_column = self.textures[texture].subsurface(
-                    offset * (TEXTURE_SIZE - SCALE), 0, SCALE, TEXTURE_SIZE
-                )
-                wall_column = pg.transform.scale(wall_column, (SCALE, proj_height))
-                wall_pos = (ray * SCALE, HALF_HEIGHT - proj_height // 2)
+            column = int(offset * (TEXTURE_SIZE - self.scale)) // WALL_CACHE_OFFSET_STEP
+            height = int(proj_height) // WALL_CACHE_HEIGHT_STEP
+            proj_height = max(height * WALL_CACHE_HEIGHT_STEP, 1)
+
+            key = texture, column, height
+            wall_column = self.column_cache.get(key)
+            if wall_column is None:
+                wall_column = self.get_wall_column(texture, column * WALL_CACHE_OFFSET_STEP, proj_height)
+                self.column_cache.put(key, wall_column)
+
+            if proj_height < self.view_height:
+                wall_pos = (ray * self.scale, self.view_height // 2 - proj_height // 2)
             else:
-                texture_height = TEXTURE_SIZE * HEIGHT / proj_height
-                wall_column = self.textures[texture].subsurface(
-                    offset * (TEXTURE_SIZE - SCALE), HALF_TEXTURE_SIZE - texture_height // 2,
-                    SCALE, texture_height
-                )
-                wall_column = pg.transform.scale(wall_column, (SCALE, HEIGHT))
-                wall_pos = (ray * SCALE, 0)
+                wall_pos = (ray * self.scale, 0)
+
+            self.wall_objects.append((depth, wall_column, wall_pos))
+
+    def get_wall_column(self, texture, column, proj_height):
+        self.game.profiler.count('surfaces_scaled')
+        if proj_height < self.view_height:
+            wall_column = self.textures[texture].subsurface(column, 0, self.scale, TEXTURE_SIZE)
+            return pg.transform.scale(wall_column, (self.scale, proj_height))
+
+        texture_height = TEXTURE_SIZE * self.view_height / proj_height
+        wall_column = self.textures[texture].subsurface(
+            column, HALF_TEXTURE_SIZE - texture_height // 2, self.scale, texture_height
+        )
+        return pg.transform.scale(wall_column, (self.scale, self.view_height))
 
-            self.objects_to_render.append((depth, wall_column, wall_pos))
+    def is_visible(self, x, width, depth):
+        # is something at depth nearer than the walls in any column of screen pixels [x, x + width)
+        depth_buffer = self.depth_buffer
+        scale = WIDTH // len(depth_buffer)
+        first, last = max(x, 0), min(x + width, len(depth_buffer) * scale)
+        return first < last and bool((depth < depth_buffer[first // scale:(last - 1) // scale + 1]).any())
+
+    def get_wall_depth(self, x):
+        # depth of the wall drawn in screen column x
+        return self.depth_buffer[x // (WIDTH // len(self.depth_buffer))]
+
+    def get_ray_angles(self):
+        # accumulated like the original per-ray loop so every backend sees the same angles
+        ray_angle = np.full(self.num_rays, self.delta_angle)
+        ray_angle[0] = self.game.player.angle - HALF_FOV + 0.0001
+        return np.cumsum(ray_angle)
+
+    def cast(self, ray_angle):
+        self.game.profiler.count('rays_cast', len(ray_angle))
+        if self.backend == 'numpy':
+            return self.cast_numpy(ray_angle)
+        return self.cast_python(ray_angle)
 
     def ray_cast(self):
-        self.ray_casting_result = []
+        ray_angle = self.get_ray_angles()
+        self.project(ray_angle, *self.cast(ray_angle))
+
+    def ray_cast_python(self):
+        ray_angle = self.get_ray_angles()
+        self.project(ray_angle, *self.cast_python(ray_angle))
+
+    def ray_cast_numpy(self):
+        ray_angle = self.get_ray_angles()
+        self.project(ray_angle, *self.cast_numpy(ray_angle))
+
+    def shift_ray_cast(self, shift):
+        # the view turned by whole rays: keep the rays still in view, cast only the new edge
+        ray_angle = self.get_ray_angles()
+        depth, texture, offset = (np.roll(values, -shift) for values in self.raw_ray_arrays)
+        new_rays = slice(-shift, None) if shift > 0 else slice(None, -shift)
+        depth[new_rays], texture[new_rays], offset[new_rays] = self.cast(ray_angle[new_rays])
+        self.reused_rays += self.num_rays - abs(shift)
+        self.project(ray_angle, depth, texture, offset)
+
+    def project(self, ray_angle, depth, texture, offset):
+        self.raw_ray_arrays = depth, texture, offset
+
+        # remove fishbowl effect
+        depth = depth * np.cos(self.game.player.angle - ray_angle)
+
+        # projection, in pixels of the view
+        proj_height = SCREEN_DIST * (self.view_height / HEIGHT) / (depth + 0.0001)
+
+        # ray casting result
+        self.depth_buffer = depth
+        self.ray_casting_arrays = depth, proj_height, texture, offset
+        self.ray_casting_result = list(zip(depth.tolist(), proj_height.tolist(), texture.tolist(), offset.tolist()))
+
+    def get_grid_origin(self):
+        # rays march in the coordinates of the resident map grid
+        game_map = self.game.map
+        ox, oy = self.game.player.x - game_map.grid_x, self.game.player.y - game_map.grid_y
+        return ox, oy, int(ox), int(oy)
+
+    def cast_python(self, ray_angle):
+        result = []
         texture_vert, texture_hor = 1, 1
-        ox, oy = self.game.player.pos
-        x_map, y_map = self.game.player.map_pos
+        grid, rows, cols = self.game.map.grid, self.game.map.grid_rows, self.game.map.grid_cols
+        ox, oy, x_map, y_map = self.get_grid_origin()
 
-        ray_angle = self.game.player.angle - HALF_FOV + 0.0001
-        for ray in range(NUM_RAYS):
+        for ray_angle in ray_angle.tolist():
             sin_a = math.sin(ray_angle)
             cos_a = math.cos(ray_angle)
 
@@ -54,9 +154,10 @@ class RayCasting:
             dx = delta_depth * cos_a
 
             for i in range(MAX_DEPTH):
-                tile_hor = int(x_hor), int(y_hor)
-                if tile_hor in self.game.map.world_map:
-                    texture_hor = self.game.map.world_map[tile_hor]
+                x, y = int(x_hor), int(y_hor)
+                tile = grid[y * cols + x] if 0 <= x < cols and 0 <= y < rows else OUT_OF_BOUNDS
+                if tile:
+                    texture_hor = tile
                     break
                 x_hor += dx
                 y_hor += dy
@@ -72,9 +173,10 @@ class RayCasting:
             dy = delta_depth * sin_a
 
             for i in range(MAX_DEPTH):
-                tile_vert = int(x_vert), int(y_vert)
-                if tile_vert in self.game.map.world_map:
-                    texture_vert = self.game.map.world_map[tile_vert]
+                x, y = int(x_vert), int(y_vert)
+                tile = grid[y * cols + x] if 0 <= x < cols and 0 <= y < rows else OUT_OF_BOUNDS
+                if tile:
+                    texture_vert = tile
                     break
                 x_vert += dx
                 y_vert += dy
@@ -90,17 +192,94 @@ class RayCasting:
                 x_hor %= 1
                 offset = (1 - x_hor) if sin_a > 0 else x_hor
 
-            # remove fishbowl effect
-            depth *= math.cos(self.game.player.angle - ray_angle)
+            result.append((depth, texture, offset))
+
+        depth, texture, offset = zip(*result)
+        return np.array(depth), np.array(texture, dtype=np.uint8), np.array(offset)
+
+    def march(self, x, y, dx, dy, depth, delta_depth):
+        # positions of every step of every ray, accumulated in the same order as the scalar loop
+        steps = (MAX_DEPTH + 1, len(x))
+        x = np.cumsum(np.vstack((x, np.broadcast_to(dx, steps)[1:])), axis=0)
+        y = np.cumsum(np.vstack((y, np.broadcast_to(dy, steps)[1:])), axis=0)
+        depth = np.cumsum(np.vstack((depth, np.broadcast_to(delta_depth, steps)[1:])), axis=0)
 
-            # projection
-            proj_height = SCREEN_DIST / (depth + 0.0001)
+        tile_x, tile_y = x[:-1].astype(np.intp), y[:-1].astype(np.intp)
+        grid = self.game.map.grid_array
+        rows, cols = grid.shape
+        inside = (tile_x >= 0) & (tile_x < cols) & (tile_y >= 0) & (tile_y < rows)
+        tiles = np.full(tile_x.shape, OUT_OF_BOUNDS, dtype=grid.dtype)
+        tiles[inside] = grid[tile_y[inside], tile_x[inside]]
 
-            # ray casting result
-            self.ray_casting_result.append((depth, proj_height, texture, offset))
+        hit = tiles > 0
+        step = np.where(hit.any(axis=0), hit.argmax(axis=0), MAX_DEPTH)
+        rays = np.arange(len(step))
+        texture = tiles[np.minimum(step, MAX_DEPTH - 1), rays]
+        # a ray that hits nothing keeps the texture of the previous hit, as in the scalar loop
+        last_hit = np.maximum.accumulate(np.where(step < MAX_DEPTH, rays, -1))
+        texture = np.where(last_hit >= 0, texture[last_hit], 1)
+        return depth[step, rays], texture, x[step, rays], y[step, rays]
 
-            ray_angle += DELTA_ANGLE
+    def cast_numpy(self, ray_angle):
+        ox, oy, x_map, y_map = self.get_grid_origin()
+        sin_a = np.sin(ray_angle)
+        cos_a = np.cos(ray_angle)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # horizontals
+            y_hor = np.where(sin_a > 0, y_map + 1, y_map - 1e-6)
+            dy = np.where(sin_a > 0, 1, -1)
+
+            depth_hor = (y_hor - oy) / sin_a
+            x_hor = ox + depth_hor * cos_a
+
+            delta_depth = dy / sin_a
+            dx = delta_depth * cos_a
+
+            depth_hor, texture_hor, x_hor, _ = self.march(x_hor, y_hor, dx, dy, depth_hor, delta_depth)
+
+            # verticals
+            x_vert = np.where(cos_a > 0, x_map + 1, x_map - 1e-6)
+            dx = np.where(cos_a > 0, 1, -1)
+
+            depth_vert = (x_vert - ox) / cos_a
+            y_vert = oy + depth_vert * sin_a
+
+            delta_depth = dx / cos_a
+            dy = delta_depth * sin_a
+
+            depth_vert, texture_vert, _, y_vert = self.march(x_vert, y_vert, dx, dy, depth_vert, delta_depth)
+
+        # depth, texture offset
+        vert = depth_vert < depth_hor
+        depth = np.where(vert, depth_vert, depth_hor)
+        texture = np.where(vert, texture_vert, texture_hor)
+        y_vert %= 1
+        x_hor %= 1
+        offset = np.where(vert, np.where(cos_a > 0, y_vert, 1 - y_vert),
+                          np.where(sin_a > 0, 1 - x_hor, x_hor))
+        return depth, texture, offset
 
     def update(self):
-        self.ray_cast()
-        self.get_objects_to_render()
\ No newline at end of file
+        player = self.game.player
+        pose = player.pos, self.game.map.version, self.num_rays
+        turn = (player.angle - self.cast_angle + math.pi) % math.tau - math.pi
+        shift = round(turn / self.delta_angle)
+
+        if pose == self.cast_pose and not turn:
+            # nothing the walls depend on has changed since the last cast
+            self.skipped_casts += 1
+            self.sprite_objects = []
+            return
+        if pose == self.cast_pose and abs(turn / self.delta_angle - shift) < 1e-6 and abs(shift) < self.num_rays:
+            self.shift_ray_cast(shift)
+        else:
+            self.ray_cast()
+        self.cast_pose, self.cast_angle = pose, player.angle
+
+        if self.game.object_renderer.wall_render_mode == 'buffer':
+            # walls go straight into the screen buffer, only sprites are queued for blitting
+            self.wall_objects = []
+        else:
+            self.get_objects_to_render()
+        self.sprite_objects = []
@@ -0,0 +1,111 @@
+import struct
+from collections import namedtuple
+import pygame as pg
+from settings import *
+
+# log layout: header, then one fixed size record per simulated frame
+MAGIC = b'DREC'
+VERSION = 1
+HEADER = struct.Struct('<4sHQ')  # magic, version, rng seed
+FRAME = struct.Struct('<dBhhB')  # delta_time, key bitmask, mouse rel, index finger rel, flags
+
+RECORDED_KEYS = pg.K_w, pg.K_s, pg.K_a, pg.K_d, pg.K_1, pg.K_2
+FLAGS = 'fire', 'index', 'gun', 'fist', 'global_trigger'
+
+
+class FrameInput(namedtuple('FrameInput', 'delta_time keys mouse_rel index_rel ' + ' '.join(FLAGS))):
+    """Everything the simulation reads from outside the game in one frame."""
+    def pack(self):
+        flags = sum(1 << i for i, name in enumerate(FLAGS) if getattr(self, name))
+        return FRAME.pack(self.delta_time, self.keys, self.mouse_rel, self.index_rel, flags)
+
+    @classmethod
+    def unpack(cls, data, offset):
+        delta_time, keys, mouse_rel, index_rel, flags = FRAME.unpack_from(data, offset)
+        return cls(delta_time, keys, mouse_rel, index_rel, *(bool(flags >> i & 1) for i in range(len(FLAGS))))
+
+
+IDLE_FRAME = FrameInput(1, 0, 0, 0, *(False for _ in FLAGS))
+
+
+class LiveInput:
+    """Reads the keyboard, mouse and hand tracking camera once per simulated frame."""
+    def __init__(self, game, virtual_mouse):
+        self.game = game
+        self.virtual_mouse = virtual_mouse
+        self.frame = IDLE_FRAME
+        self.fire = False
+        self.finished = False
+
+    def handle_event(self, event):
+        if event.type == pg.MOUSEBUTTONDOWN and event.button == 1:
+            self.fire = True
+
+    def poll(self):
+        keys = pg.key.get_pressed()
+        key_bits = sum(1 << i for i, key in enumerate(RECORDED_KEYS) if keys[key])
+
+        mx, my = pg.mouse.get_pos()
+        if mx < MOUSE_BORDER_LEFT or mx > MOUSE_BORDER_RIGHT:
+            pg.mouse.set_pos([HALF_WIDTH, HALF_HEIGHT])
+        mouse_rel = pg.mouse.get_rel()[0]
+
+        # the camera thread writes these at any time, read each one once
+        virtual_mouse = self.virtual_mouse
+        index_coords, index_rel = virtual_mouse.index_coords, 0
+        if index_coords:
+            index_rel = index_coords[0] - virtual_mouse.prev_index_x
+            virtual_mouse.prev_index_x = index_coords[0]
+
+        self.frame = FrameInput(self.game.delta_time, key_bits, mouse_rel, index_rel, self.fire,
+                                bool(index_coords), virtual_mouse.gun_flag, virtual_mouse.fist_flag,
+                                self.game.global_trigger)
+        self.fire = False
+        return self.frame
+
+    def get_pressed(self):
+        return {key: bool(self.frame.keys >> i & 1) for i, key in enumerate(RECORDED_KEYS)}
+
+    def close(self):
+        pass
+
+
+class InputRecorder(LiveInput):
+    """Live input that is also written to a log for InputReplayer."""
+    def __init__(self, game, virtual_mouse, path, seed):
+        super().__init__(game, virtual_mouse)
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, seed))
+
+    def poll(self):
+        frame = super().poll()
+        self.file.write(frame.pack())
+        return frame
+
+    def close(self):
+        self.file.close()
+
+
+class InputReplayer(LiveInput):
+    """Feeds a recorded log back one frame per poll, ignoring the real devices."""
+    def __init__(self, game, path):
+        super().__init__(game, None)
+        with open(path, 'rb') as file:
+            self.data = file.read()
+        magic, version, self.seed = HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'not a version {VERSION} input log')
+        self.num_frames = (len(self.data) - HEADER.size) // FRAME.size
+        self.index = 0
+
+    def handle_event(self, event):
+        pass
+
+    def poll(self):
+        if self.index >= self.num_frames:
+            self.finished = True
+            self.frame = IDLE_FRAME._replace(delta_time=self.game.delta_time)
+            return self.frame
+        self.frame = FrameInput.unpack(self.data, HEADER.size + FRAME.size * self.index)
+        self.index += 1
+        return self.frame
@@ -0,0 +1,47 @@
+from settings import *
+
+
+class ResolutionScaler:
+    """Trades resolution for frame time: each level casts fewer rays into a smaller frame stretched to the window."""
+    def __init__(self, game):
+        self.game = game
+        self.enabled = DYNAMIC_RES
+        self.target_frame_time = 1000 / DYNAMIC_RES_TARGET_FPS
+        self.frame_time = self.target_frame_time
+        self.level = 0
+        self.slow_frames = 0
+        self.fast_frames = 0
+
+    @property
+    def scale(self):
+        return DYNAMIC_RES_SCALES[self.level]
+
+    @property
+    def num_rays(self):
+        return int(NUM_RAYS * self.scale)
+
+    def set_level(self, level):
+        self.level = level
+        self.slow_frames, self.fast_frames = 0, 0
+        self.game.raycasting.set_resolution(self.num_rays)
+
+    def update(self):
+        if not self.enabled:
+            return
+        # raw time leaves out the clock's FPS limiting delay
+        self.frame_time += (self.game.clock.get_rawtime() - self.frame_time) * DYNAMIC_RES_SMOOTHING
+
+        if self.frame_time > self.target_frame_time * (1 + DYNAMIC_RES_HYSTERESIS):
+            self.slow_frames += 1
+            self.fast_frames = 0
+        elif self.frame_time < self.target_frame_time * (1 - DYNAMIC_RES_HYSTERESIS):
+            self.fast_frames += 1
+            self.slow_frames = 0
+        else:
+            self.slow_frames, self.fast_frames = 0, 0
+
+        # drop quickly, recover cautiously so the scale does not oscillate
+        if self.slow_frames > DYNAMIC_RES_HOLD_FRAMES and self.level < len(DYNAMIC_RES_SCALES) - 1:
+            self.set_level(self.level + 1)
+        elif self.fast_frames > 2 * DYNAMIC_RES_HOLD_FRAMES and self.level > 0:
+            self.set_level(self.level - 1)
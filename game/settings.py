@@ -7,6 +7,11 @@ HALF_WIDTH = WIDTH // 2
 HALF_HEIGHT = HEIGHT // 2
 FPS = 100
 
+MAP_PATH = 'resources/maps/level1.dmap'
+MAP_CHUNK_SIZE = 16  # tiles per chunk side
+MAP_RESIDENT_RADIUS = 2  # chunks kept decoded around the player's chunk, must cover MAX_DEPTH
+MAP_MAX_RESIDENT_CHUNKS = 64
+
 PLAYER_POS = 1.5, 5  # mini_map
 PLAYER_ANGLE = 0
 PLAYER_SPEED = 0.004
@@ -34,3 +39,62 @@ SCALE = WIDTH // NUM_RAYS
 TEXTURE_SIZE = 256
 HALF_TEXTURE_SIZE = TEXTURE_SIZE // 2
 
+
+RAY_CAST_BACKEND = 'numpy'  # 'numpy' casts all rays in one batch, 'python' one ray at a time
+WALL_RENDER_MODE = 'buffer'  # 'buffer' writes walls into the screen pixels, 'blit' blits one Surface per column
+
+# wall column strip cache: key is texture, texture column // OFFSET_STEP, projected height // HEIGHT_STEP
+WALL_CACHE_MAX_BYTES = 64 * 1024 * 1024
+WALL_CACHE_OFFSET_STEP = 1  # texels, 1 keeps every texture column
+WALL_CACHE_HEIGHT_STEP = 2  # screen pixels
+
+# dynamic resolution: render scale levels must keep WIDTH divisible by the ray count
+DYNAMIC_RES = True
+DYNAMIC_RES_TARGET_FPS = 60
+DYNAMIC_RES_SCALES = (1, 2 / 3, 1 / 2, 1 / 3, 1 / 4)
+DYNAMIC_RES_HYSTERESIS = 0.15  # dead band around the target frame time
+DYNAMIC_RES_HOLD_FRAMES = 30  # frames outside the band before the scale changes
+DYNAMIC_RES_SMOOTHING = 0.1
+
+# frame profiler: F3 toggles the overlay, F4 writes the rolling window to PROFILER_CSV_PATH
+PROFILER_HISTORY = 600  # frames
+PROFILER_MAX_MS = 50  # histogram range
+PROFILER_BINS = 25
+PROFILER_CSV_PATH = 'profile.csv'
+
+# scaled sprite cache shared by every sprite: key is frame image, projected height snapped to a geometric series
+SPRITE_CACHE_MAX_BYTES = 96 * 1024 * 1024
+SPRITE_CACHE_HEIGHT_STEP = 1.02  # ratio between neighbouring cached heights
+
+# sprites and NPCs are bucketed into SPATIAL_CELL_SIZE tile cells, only those in view are projected
+SPATIAL_CELL_SIZE = 4
+SPRITE_VIEW_DIST = MAX_DEPTH
+
+# pre-scaled raw pixel archive written by build_assets.py, PNGs are decoded when it is missing or stale
+ASSET_PACK_PATH = 'resources/assets.pack'
+
+# NPC pathfinding: steps to the player are known up to this many tiles away
+FLOW_FIELD_RADIUS = 64
+
+# NPC line of sight: NPCs in view are checked against the wall depth of LOS_RAY_WINDOW rays either side
+LOS_RAY_WINDOW = 2
+LOS_DEPTH_MARGIN = 0.25  # tiles
+
+# fixed rate simulation: health recovery, pathfinding and NPC logic and movement advance SIM_RATE times per
+# second of game time whatever the frame rate, NPCs are drawn interpolated over the steps each move covers
+SIM_RATE = 60  # steps per second
+SIM_STEP_MS = 1000 / SIM_RATE
+SIM_MAX_STEPS = 5  # per frame, game time past that is dropped rather than caught up
+NPC_STEP_SCALE = FPS / SIM_RATE  # NPC speeds are tiles per frame at FPS
+
+# NPC logic level of detail: every step within AI_NEAR_DIST, at AI_STATE_INTERVALS steps by AI_FAR_DIST,
+# and due NPCs past the near ones only while the step's NPC logic stays inside AI_STEP_BUDGET_MS
+AI_NEAR_DIST = 6  # tiles
+AI_FAR_DIST = 16
+AI_STATE_INTERVALS = {'attack': 2, 'search': 4, 'idle': 10}  # steps
+AI_MAX_TICKS = 10  # steps of movement one logic update can catch up on, times NPC_STEP_SCALE less than NPC.size
+AI_STEP_BUDGET_MS = 2
+
+# NPC line of sight and pathfinding in a worker process (main.py --ai-worker), live games only since its
+# answers arrive a wall clock dependent number of steps late
+AI_WORKER = False
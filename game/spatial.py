@@ -0,0 +1,51 @@
+import math
+from collections import defaultdict
+
+
+class SpatialGrid:
+    """Entities bucketed into square cells of the map, for finding what is near a point or in view."""
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.cells = defaultdict(set)
+        self.entity_cells = {}
+
+    def get_cell(self, x, y):
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def insert(self, entity):
+        cell = self.entity_cells[entity] = self.get_cell(entity.x, entity.y)
+        self.cells[cell].add(entity)
+
+    def move(self, entity):
+        cell = self.get_cell(entity.x, entity.y)
+        old_cell = self.entity_cells[entity]
+        if cell != old_cell:
+            self.cells[old_cell].discard(entity)
+            self.cells[cell].add(entity)
+            self.entity_cells[entity] = cell
+
+    def query_frustum(self, x, y, angle, half_fov, max_dist, margin=0):
+        """Entities in cells that overlap the view cone, widened by margin radians on each side."""
+        size = self.cell_size
+        cell_radius = size * math.sqrt(0.5)
+        reach = max_dist + cell_radius
+        min_cx, min_cy = self.get_cell(x - reach, y - reach)
+        max_cx, max_cy = self.get_cell(x + reach, y + reach)
+
+        candidates = []
+        for cx in range(min_cx, max_cx + 1):
+            for cy in range(min_cy, max_cy + 1):
+                entities = self.cells.get((cx, cy))
+                if not entities:
+                    continue
+                dx, dy = (cx + 0.5) * size - x, (cy + 0.5) * size - y
+                dist = math.hypot(dx, dy)
+                if dist > reach:
+                    continue
+                if dist > cell_radius:
+                    # anything in the cell is within asin(cell_radius / dist) of the direction to its centre
+                    delta = (math.atan2(dy, dx) - angle + math.pi) % math.tau - math.pi
+                    if abs(delta) > half_fov + margin + math.asin(cell_radius / dist):
+                        continue
+                candidates.extend(entities)
+        return candidates
@@ -1,7 +1,6 @@
 import pygame as pg
 from settings import *
-import os
-from collections import deque
+from assets import assets
 
 
 class SpriteObject:
@@ -10,7 +9,7 @@ class SpriteObject:
         self.game = game
         self.player = game.player
         self.x, self.y = pos
-        self.image = pg.image.load(path).convert_alpha()
+        self.image = assets.get_image(path)
         self.IMAGE_WIDTH = self.image.get_width()
         self.IMAGE_HALF_WIDTH = self.image.get_width() // 2
         self.IMAGE_RATIO = self.IMAGE_WIDTH / self.image.get_height()
@@ -18,72 +17,102 @@ class SpriteObject:
         self.sprite_half_width = 0
         self.SPRITE_SCALE = scale
         self.SPRITE_HEIGHT_SHIFT = shift
+        self.in_view = True  # set by ObjectHandler from the view frustum
 
     def get_sprite_projection(self):
         proj = SCREEN_DIST / self.norm_dist * self.SPRITE_SCALE
+        # snap to a cached size, so a sprite is only rescaled when its height changes by a step
+        size = round(math.log(proj, SPRITE_CACHE_HEIGHT_STEP))
+        proj = SPRITE_CACHE_HEIGHT_STEP ** size
         proj_width, proj_height = proj * self.IMAGE_RATIO, proj
 
-        image = pg.transform.scale(self.image, (proj_width, proj_height))
-
         self.sprite_half_width = proj_width // 2
         height_shift = proj_height * self.SPRITE_HEIGHT_SHIFT
         pos = self.screen_x - self.sprite_half_width, HALF_HEIGHT - proj_height // 2 + height_shift
 
-        self.game.raycasting.objects_to_render.append((self.norm_dist, image, pos))
+        # behind the walls in every column it covers: skip before scaling
+        if not self.game.raycasting.is_visible(int(pos[0]), int(proj_width), self.norm_dist):
+            self.game.profiler.count('sprites_occluded')
+            return
 
-    def get_sprite(self):
+        sprite_cache = self.game.object_renderer.sprite_cache
+        key = self.image, size
+        image = sprite_cache.get(key)
+        if image is None:
+            image = pg.transform.scale(self.image, (proj_width, proj_height))
+            sprite_cache.put(key, image)
+            self.game.profiler.count('surfaces_scaled')
+
+        self.game.raycasting.sprite_objects.append((self.norm_dist, image, pos))
+
+    def locate(self):
         dx = self.x - self.player.x
         dy = self.y - self.player.y
         self.dx, self.dy = dx, dy
         self.theta = math.atan2(dy, dx)
+        self.dist = math.hypot(dx, dy)
+
+    def get_sprite(self):
+        self.locate()
+        self.project()
+
+    def project(self):
+        dx, dy = self.dx, self.dy
 
         delta = self.theta - self.player.angle
         if (dx > 0 and self.player.angle > math.pi) or (dx < 0 and dy < 0):
             delta += math.tau
 
         delta_rays = delta / DELTA_ANGLE
-        self.screen_x = (HALF_NUM_RAYS + delta_rays) * SCALE
+        self.place((HALF_NUM_RAYS + delta_rays) * SCALE, self.dist * math.cos(delta))
 
-        self.dist = math.hypot(dx, dy)
-        self.norm_dist = self.dist * math.cos(delta)
-        if -self.IMAGE_HALF_WIDTH < self.screen_x < (WIDTH + self.IMAGE_HALF_WIDTH) and self.norm_dist > 0.5:
+    def place(self, screen_x, norm_dist):
+        self.screen_x, self.norm_dist = screen_x, norm_dist
+        if -self.IMAGE_HALF_WIDTH < screen_x < (WIDTH + self.IMAGE_HALF_WIDTH) and norm_dist > 0.5:
             self.get_sprite_projection()
 
     def update(self):
-        self.get_sprite()
+        if self.in_view:
+            self.get_sprite()
 
 
 class AnimatedSprite(SpriteObject):
     def __init__(self, game, path='resources/sprites/animated_sprites/green_light/0.png',
                  pos=(11.5, 3.5), scale=0.8, shift=0.16, animation_time=120):
         super().__init__(game, path, pos, scale, shift)
-        self.animation_time = animation_time
         self.path = path.rsplit('/', 1)[0]
         self.images = self.get_images(self.path)
-        self.animation_time_prev = pg.time.get_ticks()
-        self.animation_trigger = False
+        self.set_animation_time(animation_time)
+        # frame index per animation of this sprite, the frame tuples themselves are shared between sprites
+        self.frames = {}
 
     def update(self):
         super().update()
-        self.check_animation_time()
-        self.animate(self.images)
+        # sprites that only loop their images share the group's frame
+        self.image = self.animation_group.get_frame(self.images)
+
+    def set_animation_time(self, animation_time):
+        self.animation_time = animation_time
+        self.animation_group = self.game.animation_clock.get_group(animation_time)
+        self.animation_tick = self.animation_group.ticks
+        self.animation_trigger = False
+
+    def reset_animation(self):
+        self.frames = {}
+        self.image = self.images[0]
+        self.animation_tick = self.animation_group.ticks
+        self.animation_trigger = False
 
     def animate(self, images):
         if self.animation_trigger:
-            images.rotate(-1)
-            self.image = images[0]
+            frame = self.frames[images] = (self.frames.get(images, 0) + 1) % len(images)
+            self.image = images[frame]
 
     def check_animation_time(self):
-        self.animation_trigger = False
-        time_now = pg.time.get_ticks()
-        if time_now - self.animation_time_prev > self.animation_time:
-            self.animation_time_prev = time_now
-            self.animation_trigger = True
+        # set when the group's period has passed since the last check, however many frames ago that was
+        ticks = self.animation_group.ticks
+        self.animation_trigger = ticks != self.animation_tick
+        self.animation_tick = ticks
 
     def get_images(self, path):
-        images = deque()
-        for file_name in os.listdir(path):
-            if os.path.isfile(os.path.join(path, file_name)):
-                img = pg.image.load(path + '/' + file_name).convert_alpha()
-                images.append(img)
-        return images
+        return assets.get_animation(path)
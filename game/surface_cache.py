@@ -0,0 +1,43 @@
+from collections import OrderedDict
+
+
+class SurfaceCache:
+    """LRU cache of pre-scaled Surfaces bounded by the pixel memory they hold."""
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.surfaces = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def get_size(surface):
+        return surface.get_width() * surface.get_height() * surface.get_bytesize()
+
+    def get(self, key):
+        surface = self.surfaces.get(key)
+        if surface is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+        return surface
+
+    def put(self, key, surface):
+        self.surfaces[key] = surface
+        self.size += self.get_size(surface)
+        while self.size > self.max_bytes and self.surfaces:
+            _, evicted = self.surfaces.popitem(last=False)
+            self.size -= self.get_size(evicted)
+
+    def clear(self):
+        self.surfaces.clear()
+        self.size = 0
+
+    def reset_stats(self):
+        self.hits, self.misses = 0, 0
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
@@ -1,5 +1,4 @@
 from sprite_object import *
-from collections import deque
 
 
 class Weapon(AnimatedSprite):
@@ -29,6 +28,9 @@ class Weapon(AnimatedSprite):
             }
         }
 
+        self.reset()
+
+    def reset(self):
         # 🔥 Track current ammo separately
         self.weapon_ammo = {
             "shotgun": self.weapons["shotgun"]["max_ammo"],
@@ -43,15 +45,12 @@ class Weapon(AnimatedSprite):
     def load_weapon(self, weapon_name):
         """Load textures and settings for the given weapon."""
         weapon = self.weapons[weapon_name]
-        self.images = deque(
-            [pg.transform.smoothscale(img, (img.get_width() * weapon["scale"], img.get_height() * weapon["scale"]))
-             for img in self.get_images(weapon["path"])]
-        )
+        self.images = assets.get_animation(weapon["path"].rstrip('/'), weapon["scale"])
         self.weapon_pos = (HALF_WIDTH - self.images[0].get_width() // 2,
                            HEIGHT - self.images[0].get_height())
         self.damage = weapon["damage"]
         self.range = weapon["range"]
-        self.animation_time = weapon["animation_time"]
+        self.set_animation_time(weapon["animation_time"])
         self.sound_file = weapon["sound"]
         self.num_images = len(self.images)
         self.frame_counter = 0
@@ -71,12 +70,11 @@ class Weapon(AnimatedSprite):
         if self.reloading:
             self.game.player.shot = False
             if self.animation_trigger:
-                self.images.rotate(-1)
-                self.image = self.images[0]
                 self.frame_counter += 1
                 if self.frame_counter == self.num_images:
                     self.reloading = False
                     self.frame_counter = 0
+                self.image = self.images[self.frame_counter]
 
     def fire(self):
         """Player fires the current weapon."""
@@ -89,6 +87,11 @@ class Weapon(AnimatedSprite):
             # Start reload animation
             self.reloading = True
 
+            # the shot is resolved here, with this weapon's damage and range
+            target = self.get_target()
+            if target is not None and target.dist <= self.range:
+                target.get_damage(self.damage)
+
             # 🔥 Reduce ammo globally
             if self.ammo != float('inf'):
                 self.ammo -= 1
@@ -104,9 +107,22 @@ class Weapon(AnimatedSprite):
             empty_sound.set_volume(0.5)
             empty_sound.play()
 
+    def get_target(self):
+        """The nearest NPC on screen over the centre column and in front of the wall there, or None."""
+        raycasting = self.game.raycasting
+        if raycasting.depth_buffer is None:
+            return None
+        wall_depth = raycasting.get_wall_depth(HALF_WIDTH)
+        targets = [npc for npc in self.game.object_handler.npc_list
+                   if npc.alive and npc.in_view and abs(npc.screen_x - HALF_WIDTH) < npc.sprite_half_width]
+        target = min(targets, key=lambda npc: npc.norm_dist, default=None)
+        if target is not None and target.norm_dist < wall_depth:
+            return target
+        return None
+
     def draw(self):
         # Draw weapon sprite
-        self.game.screen.blit(self.images[0], self.weapon_pos)
+        self.game.screen.blit(self.images[self.frame_counter], self.weapon_pos)
 
         # Draw ammo counter
         ammo_text = f"{self.ammo}" if self.ammo != float('inf') else "max"